@@ -0,0 +1,226 @@
+import asyncio
+import json
+import os
+from urllib.parse import urlsplit
+
+import requests
+
+from odoo_client import OdooError
+
+try:
+    import aiohttp
+except ImportError:  # the synchronous helpers below fall back to plain requests
+    aiohttp = None
+
+# Requests allowed in flight at once against any single host
+ASYNC_HOST_CONCURRENCY = int(os.environ.get('ASYNC_HOST_CONCURRENCY', '8'))
+# Seconds to wait for a response before giving up on a request
+ASYNC_TIMEOUT = float(os.environ.get('ASYNC_TIMEOUT', '120'))
+
+CALLRAIL_API_URL = "https://api.callrail.com/v3/a/{account_id}/calls.json"
+
+
+class CallRailError(Exception):
+    """Raised when the CallRail API returns an error"""
+
+
+class HostLimiter:
+    """Hands out one semaphore per host, so every client sharing it respects one limit per API"""
+
+    def __init__(self, limit=ASYNC_HOST_CONCURRENCY):
+        self.limit = limit
+        self._semaphores = {}
+
+    def __call__(self, url):
+        host = urlsplit(url).netloc
+        if host not in self._semaphores:
+            self._semaphores[host] = asyncio.Semaphore(self.limit)
+        return self._semaphores[host]
+
+
+class AsyncOdooClient:
+    """asyncio counterpart of OdooClient for running many JSON-RPC calls from one thread.
+
+    Use as `async with AsyncOdooClient(...) as odoo:`. Pass `session_id` to
+    reuse a session the synchronous client already authenticated.
+    """
+
+    def __init__(self, url, db=None, login=None, password=None, session_id=None, limiter=None):
+        self.url = url.rstrip('/')
+        self.db = db
+        self.login = login
+        self.password = password
+        self.session_id = session_id
+        self.limiter = limiter or HostLimiter()
+        self.uid = None
+        self._session = None
+
+    async def __aenter__(self):
+        self._session = aiohttp.ClientSession(
+            headers={"Content-Type": "application/json"},
+            timeout=aiohttp.ClientTimeout(total=ASYNC_TIMEOUT)
+        )
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self._session.close()
+
+    async def _post(self, path, params):
+        payload = {
+            "jsonrpc": "2.0",
+            "method": "call",
+            "params": params
+        }
+        headers = {"Cookie": f"session_id={self.session_id}"} if self.session_id else {}
+
+        async with self.limiter(self.url):
+            try:
+                async with self._session.post(self.url + path, data=json.dumps(payload), headers=headers) as response:
+                    text = await response.text()
+                    if response.status != 200:
+                        raise OdooError(f"Status Code: {response.status}, Response: {text[:500]}")
+                    if "session_id" in response.cookies:
+                        self.session_id = response.cookies["session_id"].value
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                raise OdooError(f"Request to {path} failed: {e}")
+
+        try:
+            body = json.loads(text)
+        except json.JSONDecodeError:
+            raise OdooError(f"Invalid JSON response from {path}: {text[:500]}")
+        if "error" in body:
+            error = body["error"]
+            message = error.get("data", {}).get("message") or error.get("message")
+            raise OdooError(f"{message}")
+        return body.get("result")
+
+    async def authenticate(self):
+        result = await self._post("/web/session/authenticate", {
+            "db": self.db,
+            "login": self.login,
+            "password": self.password
+        })
+        if not result or not result.get("uid"):
+            raise OdooError("Authentication failed")
+        self.uid = result["uid"]
+        return self.session_id
+
+    async def call_kw(self, model, method, args=None, kwargs=None):
+        return await self._post(f"/web/dataset/call_kw/{model}/{method}", {
+            "model": model,
+            "method": method,
+            "args": args or [],
+            "kwargs": kwargs or {}
+        })
+
+    async def search(self, model, domain, **kwargs):
+        return await self.call_kw(model, "search", [domain], kwargs)
+
+    async def search_read(self, model, domain, fields=None, **kwargs):
+        if fields is not None:
+            kwargs["fields"] = fields
+        return await self.call_kw(model, "search_read", [domain], kwargs)
+
+    async def read(self, model, ids, fields=None):
+        kwargs = {"fields": fields} if fields is not None else {}
+        return await self.call_kw(model, "read", [list(ids)], kwargs)
+
+    async def write(self, model, ids, values):
+        return await self.call_kw(model, "write", [list(ids), values])
+
+    async def create(self, model, values):
+        return await self.call_kw(model, "create", [values])
+
+
+class AsyncCallRailClient:
+    """asyncio client for the CallRail v3 calls endpoint"""
+
+    def __init__(self, api_key, account_id, limiter=None):
+        self.api_url = CALLRAIL_API_URL.format(account_id=account_id)
+        self.headers = {
+            'Authorization': f'Token token={api_key}',
+            'Content-Type': 'application/json'
+        }
+        self.limiter = limiter or HostLimiter()
+        self._session = None
+
+    async def __aenter__(self):
+        self._session = aiohttp.ClientSession(
+            headers=self.headers,
+            timeout=aiohttp.ClientTimeout(total=ASYNC_TIMEOUT)
+        )
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self._session.close()
+
+    async def get_calls_page(self, params, page):
+        async with self.limiter(self.api_url):
+            try:
+                async with self._session.get(self.api_url, params=dict(params, page=page)) as response:
+                    if response.status != 200:
+                        raise CallRailError(f"Status code: {response.status}, Response: {await response.text()}")
+                    return await response.json()
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                raise CallRailError(f"Error making request: {e}")
+
+    async def get_calls(self, params):
+        """Fetch page 1, then every remaining page concurrently; calls come back in page order"""
+        first = await self.get_calls_page(params, 1)
+        pages = await asyncio.gather(*[
+            self.get_calls_page(params, page)
+            for page in range(2, first.get('total_pages', 1) + 1)
+        ])
+        calls = []
+        for data in [first] + list(pages):
+            calls.extend(data.get('calls', []))
+        return calls
+
+
+def fetch_calls(api_key, account_id, params):
+    """Synchronous entry point: return every call matching `params` across all pages.
+
+    Pages after the first are fetched concurrently when aiohttp is
+    installed, one after another otherwise. Raises CallRailError on failure.
+    """
+    if aiohttp is not None:
+        async def run():
+            async with AsyncCallRailClient(api_key, account_id) as callrail:
+                return await callrail.get_calls(params)
+        return asyncio.run(run())
+
+    api_url = CALLRAIL_API_URL.format(account_id=account_id)
+    headers = {
+        'Authorization': f'Token token={api_key}',
+        'Content-Type': 'application/json'
+    }
+    calls = []
+    page = 1
+    while True:
+        try:
+            response = requests.get(api_url, headers=headers, params=dict(params, page=page), timeout=ASYNC_TIMEOUT)
+        except requests.exceptions.RequestException as e:
+            raise CallRailError(f"Error making request: {e}")
+        if response.status_code != 200:
+            raise CallRailError(f"Status code: {response.status_code}, Response: {response.text}")
+        data = response.json()
+        calls.extend(data.get('calls', []))
+        if page >= data.get('total_pages', 1):
+            return calls
+        page += 1
+
+
+def call_kw_many(odoo, calls, concurrency=ASYNC_HOST_CONCURRENCY):
+    """Synchronous entry point: run (model, method, args, kwargs) calls concurrently.
+
+    Reuses the session of the already authenticated synchronous `odoo`
+    client. Returns one result per call, in order; a failed call yields its
+    OdooError instead of a result.
+    """
+    async def run():
+        async with AsyncOdooClient(odoo.url, session_id=odoo.session_id, limiter=HostLimiter(concurrency)) as client:
+            return await asyncio.gather(
+                *[client.call_kw(model, method, args, kwargs) for model, method, args, kwargs in calls],
+                return_exceptions=True
+            )
+    return asyncio.run(run())
@@ -1,9 +1,12 @@
-import requests
 import json
-import re
 import os
 from datetime import datetime, timedelta, timezone
 
+from async_clients import CallRailError, fetch_calls
+from crm_mirror import open_mirror, sync_mirror, find_leads_by_phone, normalize_phone
+from odoo_client import OdooClient, OdooError, WriteBatcher
+from utm_campaigns import CampaignResolver
+
 # Get credentials from environment variables (GitHub Secrets)
 CALLRAIL_API_KEY = os.environ.get('CALLRAIL_API_KEY')
 CALLRAIL_ACCOUNT_ID = os.environ.get('CALLRAIL_ACCOUNT_ID')
@@ -24,6 +27,12 @@ missing_vars = [var for var in required_env_vars if not os.environ.get(var)]
 if missing_vars:
     raise ValueError(f"Missing required environment variables: {', '.join(missing_vars)}")
 
+# Where the CallRail high-water mark and processed-call ledger are kept between runs
+CALL_STATE_PATH = os.environ.get('CALL_STATE_PATH', '.state/call_watermark.json')
+# How far back to look on the first run, and how long unmatched calls are retried
+CALLRAIL_LOOKBACK_HOURS = int(os.environ.get('CALLRAIL_LOOKBACK_HOURS', '240'))
+# Re-read this much before the watermark so late-arriving calls are not missed
+CALLRAIL_OVERLAP_MINUTES = int(os.environ.get('CALLRAIL_OVERLAP_MINUTES', '30'))
 
 # Map sources to IDs
 source_mapping = {
@@ -58,156 +67,30 @@ medium_mapping = {
 
 # Function to authenticate to Odoo
 def authenticate_odoo(url, db, login, password):
-    headers = {"Content-Type": "application/json"}
-    auth_data = {
-        "jsonrpc": "2.0",
-        "params": {
-            "db": db,
-            "login": login,
-            "password": password
-        }
-    }
-    response = requests.post(url + "/web/session/authenticate", data=json.dumps(auth_data), headers=headers)
-    
-    if response.status_code == 200 and "result" in response.json():
-        return response.cookies.get('session_id')
-    else:
-        print(f"Failed to authenticate. Status Code: {response.status_code}")
-        print(f"Response: {response.json()}")
+    odoo = OdooClient(url, db, login, password)
+    try:
+        odoo.authenticate()
+    except OdooError as e:
+        print(f"Failed to authenticate. {e}")
         raise ValueError("Authentication failed")
+    return odoo
 
-# Function to normalize phone numbers to the last 10 digits
-def normalize_phone(phone):
-    cleaned_phone = re.sub(r'\D', '', phone)  # Remove all non-digit characters
-    if len(cleaned_phone) > 10 and cleaned_phone.startswith('1'):
-        cleaned_phone = cleaned_phone[1:]  # Remove leading '1' for US numbers
-    return cleaned_phone[-10:]  # Return the last 10 digits
-
-# Function to find leads or opportunities by phone number in Odoo
-def find_crm_records_by_phone(url, session_id, phone):
-    headers = {
-        "Content-Type": "application/json",
-        "Cookie": f"session_id={session_id}"
-    }
+# Function to get the campaign name of a call, defaulting to "Test"
+def get_campaign_name(call_data):
+    return call_data.get('campaign') if call_data.get('campaign') else "Test"
 
-    data = {
-        "jsonrpc": "2.0",
-        "method": "call",
-        "params": {
-            "model": "crm.lead",
-            "method": "search_read",
-            "args": [[["phone", "!=", False]]],  # Get both leads and opportunities
-            "kwargs": {
-                "fields": ["id", "name", "phone"],
-                "limit": 0
-            }
-        }
-    }
-
-    response = requests.post(url + "/web/dataset/call_kw/crm.lead/search_read", data=json.dumps(data), headers=headers)
-
-    if response.status_code == 200:
-        matching_records = []
-        result = response.json().get("result", [])
-        for record in result:
-            record_phone_normalized = normalize_phone(record['phone'])
-            if record_phone_normalized == phone:
-                matching_records.append(record)
-        return matching_records
-    else:
-        print(f"Failed to fetch CRM records. Status Code: {response.status_code}")
-        print(f"Response: {response.json()}")
+# Function to update CRM records (leads and opportunities) in Odoo
+def update_crm_records(campaigns, writer, mirror, phone_to_find, call_data):
+    crm_records = find_leads_by_phone(mirror, phone_to_find)
+    if not crm_records:
+        print(f"No CRM records found with the phone number {phone_to_find}.")
         return []
 
-# Function to find or create a campaign by name in Odoo
-def get_or_create_campaign_id(url, session_id, campaign_name):
-    headers = {
-        "Content-Type": "application/json",
-        "Cookie": f"session_id={session_id}"
-    }
-    
-    # Trim whitespace from campaign name
-    campaign_name = campaign_name.strip()
-    
-    # Log the campaign name for debugging
-    print(f"Searching for campaign with name: '{campaign_name}'")
-
-    # Step 1: Search for the campaign by name
-    search_data = {
-        "jsonrpc": "2.0",
-        "method": "call",
-        "params": {
-            "model": "utm.campaign",  # Odoo model for campaigns
-            "method": "search_read",
-            "args": [[["name", "=", campaign_name]]],  # Search by campaign name
-            "kwargs": {
-                "fields": ["id", "name"],
-                "limit": 1
-            }
-        }
-    }
-
-    response = requests.post(url + "/web/dataset/call_kw/utm.campaign/search_read", 
-                             data=json.dumps(search_data), 
-                             headers=headers)
-    
-    if response.status_code == 200:
-        result = response.json().get("result", [])
-        if result:
-            # Log the found campaign name for debugging
-            print(f"Found campaign in Odoo: '{result[0]['name']}' with ID {result[0]['id']}")
-            # If campaign found, return the ID
-            return result[0]['id']
-        else:
-            # If campaign not found, create a new one
-            print(f"No matching campaign found, creating a new one with name: '{campaign_name}'")
-            return create_campaign(url, session_id, campaign_name)
-    else:
-        print(f"Failed to search campaign. Status Code: {response.status_code}")
-        print(f"Response: {response.json()}")
-        return None
-
-# Function to create a new campaign in Odoo
-def create_campaign(url, session_id, campaign_name):
-    headers = {
-        "Content-Type": "application/json",
-        "Cookie": f"session_id={session_id}"
-    }
-
-    create_data = {
-        "jsonrpc": "2.0",
-        "method": "call",
-        "params": {
-            "model": "utm.campaign",  # Odoo model for campaigns
-            "method": "create",
-            "args": [{
-                "name": campaign_name  # Create a campaign with the given name
-            }],
-            "kwargs": {}  # Add the kwargs argument to avoid the error
-        }
-    }
-
-    response = requests.post(url + "/web/dataset/call_kw/utm.campaign/create", 
-                             data=json.dumps(create_data), 
-                             headers=headers)
-    
-    if response.status_code == 200 and response.json().get("result"):
-        new_campaign_id = response.json()["result"]
-        print(f"Created new campaign '{campaign_name}' with ID {new_campaign_id}")
-        return new_campaign_id
-    else:
-        print(f"Failed to create campaign. Status Code: {response.status_code}")
-        print(f"Response: {response.json()}")
-        return None
-
-# Function to update CRM records (leads and opportunities) in Odoo
-def update_crm_records(url, session_id, phone_to_find, call_data):
     # Map source, if available, otherwise default to None
     source_id = source_mapping.get(call_data.get('source'), None)
     
     # Get the campaign ID based on the campaign name, if it exists
-    campaign_name = call_data.get('campaign') if call_data.get('campaign') else "Test"  # Default to "Test"
-    campaign_id = get_or_create_campaign_id(url, session_id, campaign_name)  # Fetch or create the campaign
+    campaign_id = campaigns.get(get_campaign_name(call_data))  # Resolved in bulk before the loop
     
     # First try to find an exact match for medium
     medium = call_data.get('medium', '')
@@ -229,91 +112,146 @@ def update_crm_records(url, session_id, phone_to_find, call_data):
         'referred': 'CallRail'  # Always set referred to "CallRail"
     }
 
-    crm_records = find_crm_records_by_phone(url, session_id, phone_to_find)
-    
-    if crm_records:
-        print(f"Found {len(crm_records)} CRM records with the phone number {phone_to_find}.")
-        for record in crm_records:
-            print(f"Updating CRM Record ID {record['id']}, Name={record['name']}, Phone={record['phone']}")
-            update_record(url, session_id, record['id'], updated_data, "crm.lead")
-    else:
-        print(f"No CRM records found with the phone number {phone_to_find}.")
-
-# Function to update a record in Odoo
-def update_record(url, session_id, record_id, updated_data, model):
-    headers = {
-        "Content-Type": "application/json",
-        "Cookie": f"session_id={session_id}"
-    }
-
-    data = {
-        "jsonrpc": "2.0",
-        "method": "call",
-        "params": {
-            "model": model,
-            "method": "write",
-            "args": [[record_id], updated_data],
-            "kwargs": {}
-        }
-    }
-
-    response = requests.post(url + "/web/dataset/call_kw/" + model + "/write", data=json.dumps(data), headers=headers)
-
-    if response.status_code == 200 and response.json().get("result"):
-        print(f"Record ID {record_id} in {model} successfully updated.")
-    else:
-        print(f"Failed to update record. Status Code: {response.status_code}")
-        print(f"Response: {response.json()}")
-
-# Function to get the last 5 hours of calls from CallRail
-def get_last_5_hours_calls():
-    api_url = f"https://api.callrail.com/v3/a/{CALLRAIL_ACCOUNT_ID}/calls.json"
-    
+    print(f"Found {len(crm_records)} CRM records with the phone number {phone_to_find}.")
+    for record in crm_records:
+        print(f"Updating CRM Record ID {record['id']}, Name={record['name']}, Phone={record['phone']}")
+        writer.queue_changes("crm.lead", record, updated_data)
+    return [record['id'] for record in crm_records]
+
+# Function to parse a CallRail start_time into an aware datetime
+def parse_call_time(start_time):
+    return datetime.fromisoformat(start_time.replace('Z', '+00:00'))
+
+# Function to load the CallRail watermark and processed-call ledger
+def load_call_state():
+    try:
+        with open(CALL_STATE_PATH) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {'watermark': None, 'applied': {}, 'unmatched': {}}
+
+# Function to persist the CallRail watermark and processed-call ledger
+def save_call_state(state):
+    directory = os.path.dirname(CALL_STATE_PATH)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp_path = CALL_STATE_PATH + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(state, f, indent=2)
+    os.replace(tmp_path, CALL_STATE_PATH)
+
+# Function to get every call from CallRail that started at or after `since`
+def get_calls_since(since):
     now = datetime.now(timezone.utc)
-    five_hours_ago = now - timedelta(hours=240)
 
     now_iso = now.strftime('%Y-%m-%dT%H:%M:%SZ')
-    five_hours_ago_iso = five_hours_ago.strftime('%Y-%m-%dT%H:%M:%SZ')
-
-    headers = {
-        'Authorization': f'Token token={CALLRAIL_API_KEY}',
-        'Content-Type': 'application/json'
-    }
+    since_iso = since.astimezone(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
 
     params = {
-        'start_date': five_hours_ago_iso,
+        'start_date': since_iso,
         'end_date': now_iso,
-        'fields': 'source,campaign,landing_page_url,customer_phone_number,medium'
+        'fields': 'source,campaign,landing_page_url,customer_phone_number,medium,start_time',
+        'per_page': 250
     }
 
-    print(f"Fetching calls between {five_hours_ago_iso} and {now_iso}")
+    print(f"Fetching calls between {since_iso} and {now_iso}")
     
-    response = requests.get(api_url, headers=headers, params=params)
-
-    if response.status_code == 200:
-        calls = response.json().get('calls', [])
-        print(f"Retrieved {len(calls)} call(s) from the last 5 hours:")
-        for call in calls:
-            landing_page_url = call.get('landing_page_url')
-            call['website'] = landing_page_url.split('?')[0] if landing_page_url else None  # Safe handling of None
-            print(json.dumps(call, indent=2))  # Print full call details including website
-        return calls
-    else:
-        print(f"Failed to retrieve calls. Status code: {response.status_code}")
-        print(f"Response: {response.text}")
-        return []
+    try:
+        calls = fetch_calls(CALLRAIL_API_KEY, CALLRAIL_ACCOUNT_ID, params)
+    except CallRailError as e:
+        print(f"Failed to retrieve calls. {e}")
+        return None
+
+    print(f"Retrieved {len(calls)} call(s) since {since_iso}:")
+    for call in calls:
+        landing_page_url = call.get('landing_page_url')
+        call['website'] = landing_page_url.split('?')[0] if landing_page_url else None  # Safe handling of None
+    return calls
 
 # Main function
 def main():
-    session_id = authenticate_odoo(odoo_url, db, login, password)
+    state = load_call_state()
+    now = datetime.now(timezone.utc)
+
+    # Start just before the last processed call, or look back the full window on the first run
+    if state['watermark']:
+        since = parse_call_time(state['watermark']['start_time']) - timedelta(minutes=CALLRAIL_OVERLAP_MINUTES)
+    else:
+        since = now - timedelta(hours=CALLRAIL_LOOKBACK_HOURS)
 
-    # Pull the last 5 hours of calls from CallRail
-    calls = get_last_5_hours_calls()
+    calls = get_calls_since(since)
+    if calls is None:
+        return
 
-    # Process each call and update corresponding Odoo records
+    # Calls already applied are skipped entirely; unmatched calls from earlier runs are
+    # retried until they age out, in case their lead is created in Odoo later
+    pending = dict(state['unmatched'])
+    skipped = 0
     for call in calls:
-        phone_to_find = normalize_phone(call['customer_phone_number'])
-        update_crm_records(odoo_url, session_id, phone_to_find, call)
+        if call['id'] in state['applied']:
+            skipped += 1
+            continue
+        print(json.dumps(call, indent=2))  # Print full call details including website
+        pending[call['id']] = call
+    print(f"Skipping {skipped} already applied call(s); {len(pending)} call(s) to process.")
+
+    if pending:
+        odoo = authenticate_odoo(odoo_url, db, login, password)
+
+        # Bring the local crm.lead mirror up to date; calls are matched and diffed against it,
+        # so a stale mirror would skip writes. Stop without saving the state so the calls are retried
+        mirror = open_mirror()
+        if not sync_mirror(mirror, odoo):
+            print("CRM mirror could not be synced; stopping so the calls are retried on the next run.")
+            return
+
+        # Resolve the campaigns of every call that matches a lead in one go
+        campaigns = CampaignResolver(odoo)
+        campaigns.resolve([
+            get_campaign_name(call) for call in pending.values()
+            if find_leads_by_phone(mirror, call['customer_phone_number'])
+        ])
+
+        # Process each call; the CRM writes are coalesced and sent at the end
+        writer = WriteBatcher(odoo)
+        matched = {}  # call id -> ids of the leads its writes went to
+        for call_id, call in pending.items():
+            phone_to_find = normalize_phone(call['customer_phone_number'])
+            matched[call_id] = update_crm_records(campaigns, writer, mirror, phone_to_find, call)
+        writer.flush()
+        print(f"Skipped {writer.skipped} unchanged record write(s); applied {writer.applied} record update(s) in {writer.requests} write request(s).")
+
+        # A call only counts as applied once every write for its leads went through;
+        # unmatched calls and calls with a failed write are retried on the next run
+        for call_id, call in pending.items():
+            record_ids = matched[call_id]
+            if record_ids and not any(("crm.lead", record_id) in writer.failed_ids for record_id in record_ids):
+                state['applied'][call_id] = call['start_time']
+                state['unmatched'].pop(call_id, None)
+            else:
+                state['unmatched'][call_id] = call
+
+    # Advance the watermark to the newest call seen and drop ledger entries that
+    # can no longer fall inside a fetch window
+    if calls:
+        newest = max(calls, key=lambda call: (parse_call_time(call['start_time']), call['id']))
+        current = state['watermark']
+        if not current or parse_call_time(newest['start_time']) >= parse_call_time(current['start_time']):
+            state['watermark'] = {'start_time': newest['start_time'], 'id': newest['id']}
+
+    if state['watermark']:
+        applied_cutoff = parse_call_time(state['watermark']['start_time']) - timedelta(minutes=CALLRAIL_OVERLAP_MINUTES)
+        state['applied'] = {
+            call_id: start_time for call_id, start_time in state['applied'].items()
+            if parse_call_time(start_time) >= applied_cutoff
+        }
+    retry_cutoff = now - timedelta(hours=CALLRAIL_LOOKBACK_HOURS)
+    state['unmatched'] = {
+        call_id: call for call_id, call in state['unmatched'].items()
+        if parse_call_time(call['start_time']) >= retry_cutoff
+    }
+
+    save_call_state(state)
 
 if __name__ == '__main__':
     main()
@@ -1,9 +1,12 @@
 import requests
 import json
-import re
 import os
 from datetime import datetime, timedelta, timezone
 
+from crm_mirror import open_mirror, sync_mirror, find_leads_by_phone, normalize_phone
+from odoo_client import OdooClient, OdooError, WriteBatcher
+from utm_campaigns import CampaignResolver
+
 # Get credentials from environment variables (GitHub Secrets)
 CALLRAIL_API_KEY = os.environ.get('CALLRAIL_API_KEY')
 CALLRAIL_ACCOUNT_ID = os.environ.get('CALLRAIL_ACCOUNT_ID')
@@ -57,146 +60,22 @@ medium_mapping = {
 
 # Function to authenticate to Odoo
 def authenticate_odoo(url, db, login, password):
-    headers = {"Content-Type": "application/json"}
-    auth_data = {
-        "jsonrpc": "2.0",
-        "params": {
-            "db": db,
-            "login": login,
-            "password": password
-        }
-    }
-    response = requests.post(url + "/web/session/authenticate", data=json.dumps(auth_data), headers=headers)
-    
-    if response.status_code == 200 and "result" in response.json():
-        return response.cookies.get('session_id')
-    else:
-        print(f"Failed to authenticate. Status Code: {response.status_code}")
-        print(f"Response: {response.json()}")
+    odoo = OdooClient(url, db, login, password)
+    try:
+        odoo.authenticate()
+    except OdooError as e:
+        print(f"Failed to authenticate. {e}")
         raise ValueError("Authentication failed")
+    return odoo
 
-# Function to normalize phone numbers to the last 10 digits
-def normalize_phone(phone):
-    cleaned_phone = re.sub(r'\D', '', phone)  # Remove all non-digit characters
-    if len(cleaned_phone) > 10 and cleaned_phone.startswith('1'):
-        cleaned_phone = cleaned_phone[1:]  # Remove leading '1' for US numbers
-    return cleaned_phone[-10:]  # Return the last 10 digits
-
-# Function to find leads or opportunities by phone number in Odoo
-def find_crm_records_by_phone(url, session_id, phone):
-    headers = {
-        "Content-Type": "application/json",
-        "Cookie": f"session_id={session_id}"
-    }
-
-    data = {
-        "jsonrpc": "2.0",
-        "method": "call",
-        "params": {
-            "model": "crm.lead",
-            "method": "search_read",
-            "args": [[["phone", "!=", False]]],  # Get both leads and opportunities
-            "kwargs": {
-                "fields": ["id", "name", "phone"],
-                "limit": 0
-            }
-        }
-    }
-
-    response = requests.post(url + "/web/dataset/call_kw/crm.lead/search_read", data=json.dumps(data), headers=headers)
-
-    if response.status_code == 200:
-        matching_records = []
-        result = response.json().get("result", [])
-        for record in result:
-            record_phone_normalized = normalize_phone(record['phone'])
-            if record_phone_normalized == phone:
-                matching_records.append(record)
-        return matching_records
-    else:
-        print(f"Failed to fetch CRM records. Status Code: {response.status_code}")
-        print(f"Response: {response.json()}")
-        return []
-
-# Function to find or create a campaign by name in Odoo
-def get_or_create_campaign_id(url, session_id, campaign_name):
-    headers = {
-        "Content-Type": "application/json",
-        "Cookie": f"session_id={session_id}"
-    }
-    
-    campaign_name = campaign_name.strip()
-    print(f"Searching for campaign with name: '{campaign_name}'")
-
-    search_data = {
-        "jsonrpc": "2.0",
-        "method": "call",
-        "params": {
-            "model": "utm.campaign",
-            "method": "search_read",
-            "args": [[["name", "=", campaign_name]]],
-            "kwargs": {
-                "fields": ["id", "name"],
-                "limit": 1
-            }
-        }
-    }
-
-    response = requests.post(url + "/web/dataset/call_kw/utm.campaign/search_read", 
-                             data=json.dumps(search_data), 
-                             headers=headers)
-    
-    if response.status_code == 200:
-        result = response.json().get("result", [])
-        if result:
-            print(f"Found campaign in Odoo: '{result[0]['name']}' with ID {result[0]['id']}")
-            return result[0]['id']
-        else:
-            print(f"No matching campaign found, creating a new one with name: '{campaign_name}'")
-            return create_campaign(url, session_id, campaign_name)
-    else:
-        print(f"Failed to search campaign. Status Code: {response.status_code}")
-        print(f"Response: {response.json()}")
-        return None
-
-# Function to create a new campaign in Odoo
-def create_campaign(url, session_id, campaign_name):
-    headers = {
-        "Content-Type": "application/json",
-        "Cookie": f"session_id={session_id}"
-    }
-
-    create_data = {
-        "jsonrpc": "2.0",
-        "method": "call",
-        "params": {
-            "model": "utm.campaign",
-            "method": "create",
-            "args": [{
-                "name": campaign_name
-            }],
-            "kwargs": {}
-        }
-    }
-
-    response = requests.post(url + "/web/dataset/call_kw/utm.campaign/create", 
-                             data=json.dumps(create_data), 
-                             headers=headers)
-    
-    if response.status_code == 200 and response.json().get("result"):
-        new_campaign_id = response.json()["result"]
-        print(f"Created new campaign '{campaign_name}' with ID {new_campaign_id}")
-        return new_campaign_id
-    else:
-        print(f"Failed to create campaign. Status Code: {response.status_code}")
-        print(f"Response: {response.json()}")
-        return None
+# Function to get the campaign name of a call, defaulting to "Test"
+def get_campaign_name(call_data):
+    return call_data.get('campaign') if call_data.get('campaign') else "Test"
 
 # Function to update CRM records and find related sales orders
-def update_crm_records(url, session_id, phone_to_find, call_data):
+def update_crm_records(campaigns, writer, mirror, phone_to_find, call_data, partner_updates):
     source_id = source_mapping.get(call_data.get('source'), None)
-    campaign_name = call_data.get('campaign') if call_data.get('campaign') else "Test"
-    campaign_id = get_or_create_campaign_id(url, session_id, campaign_name)
+    campaign_id = campaigns.get(get_campaign_name(call_data))
     
     medium = call_data.get('medium', '')
     medium_id = medium_mapping.get(medium)
@@ -216,107 +95,50 @@ def update_crm_records(url, session_id, phone_to_find, call_data):
         'referred': 'CallRail'
     }
 
-    crm_records = find_crm_records_by_phone(url, session_id, phone_to_find)
+    crm_records = find_leads_by_phone(mirror, phone_to_find)
     
     if crm_records:
         print(f"Found {len(crm_records)} CRM records with the phone number {phone_to_find}.")
         for record in crm_records:
             print(f"Updating CRM Record ID {record['id']}, Name={record['name']}, Phone={record['phone']}")
-            update_record(url, session_id, record['id'], updated_data, "crm.lead")
-            
-            print("\nChecking for related records...")
-            find_related_records(url, session_id, record['id'], updated_data)
-            print("------------------------")
-    else:
-        print(f"No CRM records found with the phone number {phone_to_find}.")
-
-# Function to update a record in Odoo
-def update_record(url, session_id, record_id, updated_data, model):
-    headers = {
-        "Content-Type": "application/json",
-        "Cookie": f"session_id={session_id}"
-    }
-
-    data = {
-        "jsonrpc": "2.0",
-        "method": "call",
-        "params": {
-            "model": model,
-            "method": "write",
-            "args": [[record_id], updated_data],
-            "kwargs": {}
-        }
-    }
-
-    response = requests.post(url + "/web/dataset/call_kw/" + model + "/write", data=json.dumps(data), headers=headers)
+            writer.queue_changes("crm.lead", record, updated_data)
 
-    if response.status_code == 200 and response.json().get("result"):
-        print(f"Record ID {record_id} in {model} successfully updated.")
+            # Related sales orders are looked up for all partners at once after the loop;
+            # re-inserting keeps the partner's latest update last, as a later call wins
+            if record['partner_id']:
+                partner_updates.pop(record['partner_id'], None)
+                partner_updates[record['partner_id']] = updated_data
     else:
-        print(f"Failed to update record. Status Code: {response.status_code}")
-        print(f"Response: {response.json()}")
-
-# Function to find and update related sales orders
-def find_related_records(url, session_id, lead_id, updated_data):
-    headers = {
-        "Content-Type": "application/json",
-        "Cookie": f"session_id={session_id}"
-    }
-
-    lead_data = {
-        "jsonrpc": "2.0",
-        "method": "call",
-        "params": {
-            "model": "crm.lead",
-            "method": "read",
-            "args": [lead_id],
-            "kwargs": {"fields": ["partner_id", "phone"]}
-        }
-    }
-
-    response = requests.post(
-        url + "/web/dataset/call_kw/crm.lead/read",
-        data=json.dumps(lead_data),
-        headers=headers
-    )
-
-    if response.status_code == 200:
-        lead_info = response.json().get("result", [{}])[0]
-        partner_id = lead_info.get('partner_id', [False])[0] if lead_info.get('partner_id') else False
+        print(f"No CRM records found with the phone number {phone_to_find}.")
 
-        if partner_id:
-            sale_data = {
-                "jsonrpc": "2.0",
-                "method": "call",
-                "params": {
-                    "model": "sale.order",
-                    "method": "search_read",
-                    "args": [[("partner_id", "=", partner_id)]],
-                    "kwargs": {
-                        "fields": ["name"],
-                        "limit": 0
-                    }
-                }
+# Function to find and update the sales orders of every matched lead's partner
+def find_related_records(odoo, writer, partner_updates):
+    if not partner_updates:
+        return
+
+    print(f"\nChecking for related records of {len(partner_updates)} partner(s)...")
+    try:
+        sales = odoo.search_read(
+            "sale.order",
+            [("partner_id", "in", list(partner_updates))],
+            ["name", "partner_id", "source_id", "campaign_id", "medium_id"],
+            limit=0
+        )
+    except OdooError as e:
+        print(f"Failed to fetch sales orders. {e}")
+        return
+
+    if sales:
+        print("\nRelated Sales Orders:")
+        for sale in sales:
+            print(f"- SO Number: {sale['name']}")
+            updated_data = partner_updates[sale['partner_id'][0]]
+            utm_data = {
+                'source_id': updated_data.get('source_id'),
+                'campaign_id': updated_data.get('campaign_id'),
+                'medium_id': updated_data.get('medium_id')
             }
-
-            sale_response = requests.post(
-                url + "/web/dataset/call_kw/sale.order/search_read",
-                data=json.dumps(sale_data),
-                headers=headers
-            )
-
-            if sale_response.status_code == 200:
-                sales = sale_response.json().get("result", [])
-                if sales:
-                    print("\nRelated Sales Orders:")
-                    for sale in sales:
-                        print(f"- SO Number: {sale['name']}")
-                        utm_data = {
-                            'source_id': updated_data.get('source_id'),
-                            'campaign_id': updated_data.get('campaign_id'),
-                            'medium_id': updated_data.get('medium_id')
-                        }
-                        update_record(url, session_id, sale['id'], utm_data, "sale.order")
+            writer.queue_changes("sale.order", sale, utm_data)
 
 # Function to get the last 5 hours of calls from CallRail
 def get_last_5_hours_calls():
@@ -358,11 +180,28 @@ def get_last_5_hours_calls():
 
 # Main function
 def main():
-    session_id = authenticate_odoo(odoo_url, db, login, password)
+    odoo = authenticate_odoo(odoo_url, db, login, password)
     calls = get_last_5_hours_calls()
+    if not calls:
+        return
+    mirror = open_mirror()
+    # Leads are matched and diffed against the mirror, so never run on a stale one
+    if not sync_mirror(mirror, odoo):
+        print("CRM mirror could not be synced; stopping without updating any records.")
+        return
+    campaigns = CampaignResolver(odoo)
+    campaigns.resolve([
+        get_campaign_name(call) for call in calls
+        if find_leads_by_phone(mirror, call['customer_phone_number'])
+    ])
+    writer = WriteBatcher(odoo)
+    partner_updates = {}
     for call in calls:
         phone_to_find = normalize_phone(call['customer_phone_number'])
-        update_crm_records(odoo_url, session_id, phone_to_find, call)
+        update_crm_records(campaigns, writer, mirror, phone_to_find, call, partner_updates)
+    find_related_records(odoo, writer, partner_updates)
+    writer.flush()
+    print(f"Skipped {writer.skipped} unchanged record write(s); applied {writer.applied} record update(s) in {writer.requests} write request(s).")
 
 if __name__ == '__main__':
     main()
\ No newline at end of file
@@ -1,11 +1,12 @@
-import requests
-import json
 import os
 import gspread
 from google.oauth2.service_account import Credentials
 from datetime import datetime, timedelta, timezone
 import traceback
 
+from async_clients import CallRailError, fetch_calls
+from sheets_batch import SheetBatch
+
 # Configuration - using your existing secret names
 CALLRAIL_API_KEY = os.environ.get('CALLRAIL_API_KEY')
 CALLRAIL_ACCOUNT_ID = os.environ.get('CALLRAIL_ACCOUNT_ID')
@@ -22,8 +23,6 @@ def authenticate_sheets():
 
 def get_last_30_days_calls():
     """Fetch calls from the last 30 days from CallRail API"""
-    api_url = f"https://api.callrail.com/v3/a/{CALLRAIL_ACCOUNT_ID}/calls.json"
-    
     # Calculate date range (last 30 days)
     now = datetime.now(timezone.utc)
     thirty_days_ago = now - timedelta(days=30)
@@ -31,51 +30,22 @@ def get_last_30_days_calls():
     now_iso = now.strftime('%Y-%m-%dT%H:%M:%SZ')
     thirty_days_ago_iso = thirty_days_ago.strftime('%Y-%m-%dT%H:%M:%SZ')
 
-    headers = {
-        'Authorization': f'Token token={CALLRAIL_API_KEY}',
-        'Content-Type': 'application/json'
-    }
-
     # Using all available fields that match our needs
     params = {
         'start_date': thirty_days_ago_iso,
         'end_date': now_iso,
         'fields': 'answered,tracking_phone_number,source,start_time,duration,customer_name,customer_phone_number,customer_city,customer_state,customer_country,device_type,keywords,referrer_domain,medium,landing_page_url,campaign,value,recording,agent_email,first_call,note',
-        'per_page': 100
+        'per_page': 250
     }
 
     print(f"Fetching calls from {thirty_days_ago_iso} to {now_iso}")
     
-    all_calls = []
-    page = 1
-    
+    # Pages after the first are fetched concurrently
     try:
-        while True:
-            params['page'] = page
-            response = requests.get(api_url, headers=headers, params=params)
-            
-            if response.status_code == 200:
-                calls_data = response.json()
-                calls = calls_data.get('calls', [])
-                
-                if not calls:
-                    break
-                    
-                all_calls.extend(calls)
-                print(f"Fetched page {page}, got {len(calls)} calls (total: {len(all_calls)})")
-                
-                # Check if we have more pages
-                if len(calls) < 100:  # Last page
-                    break
-                    
-                page += 1
-            else:
-                print(f"Failed to retrieve calls. Status code: {response.status_code}")
-                print(f"Response: {response.text}")
-                break
-                
-    except requests.exceptions.RequestException as e:
-        print(f"Error making request: {e}")
+        all_calls = fetch_calls(CALLRAIL_API_KEY, CALLRAIL_ACCOUNT_ID, params)
+    except CallRailError as e:
+        print(f"Failed to retrieve calls. {e}")
+        all_calls = []
 
     print(f"Total calls fetched: {len(all_calls)}")
     return all_calls
@@ -166,8 +136,9 @@ def write_to_sheet(sheets, data):
             print(f"Creating new worksheet: {WORKSHEET_NAME}")
             worksheet = spreadsheet.add_worksheet(title=WORKSHEET_NAME, rows=5000, cols=26)
         
-        # Clear existing data
-        worksheet.clear()
+        # Clear, write and format the sheet in one batch update
+        batch = SheetBatch(worksheet)
+        batch.clear()
         
         # Add timestamp info
         timestamp_info = [
@@ -181,40 +152,38 @@ def write_to_sheet(sheets, data):
         all_data = timestamp_info + data
         
         # Write all data to sheet
-        worksheet.update(values=all_data, range_name="A1")
+        batch.values(all_data)
         
         # Apply formatting
-        try:
-            # Format header information
-            worksheet.format("A1:A3", {
-                "textFormat": {"bold": True, "fontSize": 12},
-                "backgroundColor": {"red": 0.9, "green": 0.9, "blue": 0.9}
-            })
-            
-            # Format data headers (row 5 after our info rows)
-            header_row = 5
-            worksheet.format(f"A{header_row}:X{header_row}", {
-                "textFormat": {"bold": True},
-                "backgroundColor": {"red": 0.8, "green": 0.8, "blue": 0.9},
-                "horizontalAlignment": "CENTER"
-            })
-            
-            # Add borders
-            data_end_row = len(all_data)
-            worksheet.format(f"A{header_row}:X{data_end_row}", {
-                "borders": {
-                    "top": {"style": "SOLID"},
-                    "bottom": {"style": "SOLID"},
-                    "left": {"style": "SOLID"},
-                    "right": {"style": "SOLID"}
-                }
-            })
-            
-            # Freeze header row
-            worksheet.freeze(rows=header_row)
-            
-        except Exception as e:
-            print(f"Note: Some formatting could not be applied: {e}")
+        # Format header information
+        batch.format("A1:A3", {
+            "textFormat": {"bold": True, "fontSize": 12},
+            "backgroundColor": {"red": 0.9, "green": 0.9, "blue": 0.9}
+        })
+        
+        # Format data headers (row 5 after our info rows)
+        header_row = 5
+        batch.format(f"A{header_row}:X{header_row}", {
+            "textFormat": {"bold": True},
+            "backgroundColor": {"red": 0.8, "green": 0.8, "blue": 0.9},
+            "horizontalAlignment": "CENTER"
+        })
+        
+        # Add borders
+        data_end_row = len(all_data)
+        batch.format(f"A{header_row}:X{data_end_row}", {
+            "borders": {
+                "top": {"style": "SOLID"},
+                "bottom": {"style": "SOLID"},
+                "left": {"style": "SOLID"},
+                "right": {"style": "SOLID"}
+            }
+        })
+        
+        # Freeze header row
+        batch.freeze(rows=header_row)
+        
+        batch.send()
         
         print(f"Successfully updated '{WORKSHEET_NAME}' worksheet with {len(data)-1} calls")
         return True
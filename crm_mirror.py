@@ -0,0 +1,171 @@
+import os
+import re
+import sqlite3
+
+from odoo_client import OdooError
+
+# Local SQLite copy of the crm.lead fields our scripts look up, kept current by
+# pulling only the rows whose write_date moved since the previous sync
+CRM_MIRROR_PATH = os.environ.get('CRM_MIRROR_PATH', '.state/crm_mirror.sqlite3')
+
+# Bump when the table layout changes; an outdated mirror is dropped and rebuilt
+SCHEMA_VERSION = 2
+
+MIRROR_FIELDS = [
+    "id", "name", "phone", "email_from", "partner_id",
+    "source_id", "campaign_id", "medium_id", "website", "referred", "write_date"
+]
+
+def normalize_phone(phone):
+    """Normalize a phone number to its last 10 digits"""
+    cleaned_phone = re.sub(r'\D', '', phone or '')  # Remove all non-digit characters
+    if len(cleaned_phone) > 10 and cleaned_phone.startswith('1'):
+        cleaned_phone = cleaned_phone[1:]  # Remove leading '1' for US numbers
+    return cleaned_phone[-10:]  # Return the last 10 digits
+
+def normalize_email(email):
+    """Normalize an email address for case-insensitive matching"""
+    return (email or '').strip().lower()
+
+def open_mirror(path=CRM_MIRROR_PATH):
+    """Open (and create if needed) the local crm.lead mirror"""
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+    conn = sqlite3.connect(path)
+    conn.row_factory = sqlite3.Row
+
+    if conn.execute("PRAGMA user_version").fetchone()[0] != SCHEMA_VERSION:
+        conn.executescript("""
+            DROP TABLE IF EXISTS crm_lead;
+            DROP TABLE IF EXISTS sync_state;
+        """)
+        conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+    conn.executescript("""
+        CREATE TABLE IF NOT EXISTS crm_lead (
+            id INTEGER PRIMARY KEY,
+            name TEXT,
+            phone TEXT,
+            phone_normalized TEXT,
+            email_from TEXT,
+            email_normalized TEXT,
+            partner_id INTEGER,
+            source_id INTEGER,
+            campaign_id INTEGER,
+            medium_id INTEGER,
+            website TEXT,
+            referred TEXT,
+            write_date TEXT
+        );
+        CREATE INDEX IF NOT EXISTS crm_lead_phone ON crm_lead (phone_normalized);
+        CREATE INDEX IF NOT EXISTS crm_lead_email ON crm_lead (email_normalized);
+        CREATE TABLE IF NOT EXISTS sync_state (
+            key TEXT PRIMARY KEY,
+            value TEXT
+        );
+    """)
+    conn.commit()
+    return conn
+
+def _many2one_id(value):
+    """Return the id of a many2one value ([id, name], a bare id or False)"""
+    if isinstance(value, list):
+        return value[0] if value else None
+    if isinstance(value, int) and not isinstance(value, bool):
+        return value
+    return None
+
+def upsert_leads(conn, records):
+    """Insert or refresh crm.lead records (as returned by search_read) in the mirror"""
+    conn.executemany("""
+        INSERT OR REPLACE INTO crm_lead (
+            id, name, phone, phone_normalized, email_from, email_normalized,
+            partner_id, source_id, campaign_id, medium_id, website, referred, write_date
+        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    """, [
+        (
+            record['id'],
+            record.get('name') or None,
+            record.get('phone') or None,
+            normalize_phone(record.get('phone')) or None,
+            record.get('email_from') or None,
+            normalize_email(record.get('email_from')) or None,
+            _many2one_id(record.get('partner_id')),
+            _many2one_id(record.get('source_id')),
+            _many2one_id(record.get('campaign_id')),
+            _many2one_id(record.get('medium_id')),
+            record.get('website') or None,
+            record.get('referred') or None,
+            record.get('write_date') or None
+        )
+        for record in records
+    ])
+    conn.commit()
+
+def _get_state(conn, key):
+    row = conn.execute("SELECT value FROM sync_state WHERE key = ?", (key,)).fetchone()
+    return row['value'] if row else None
+
+def _set_state(conn, key, value):
+    conn.execute("INSERT OR REPLACE INTO sync_state (key, value) VALUES (?, ?)", (key, value))
+    conn.commit()
+
+def sync_mirror(conn, odoo):
+    """Pull crm.lead rows changed since the last sync and drop rows gone from Odoo.
+
+    Returns True when the mirror is current, False when Odoo could not be read
+    (the mirror then still holds the data of the last successful sync).
+    """
+    last_write_date = _get_state(conn, 'last_write_date')
+
+    # ">=" re-reads the rows written in the last second of the previous sync,
+    # which is cheap and guarantees nothing written in that second is missed
+    domain = [["write_date", ">=", last_write_date]] if last_write_date else []
+    try:
+        records = odoo.search_read("crm.lead", domain, MIRROR_FIELDS, limit=0)
+    except OdooError as e:
+        print(f"Failed to sync CRM mirror. {e}")
+        return False
+
+    upsert_leads(conn, records)
+    write_dates = [record['write_date'] for record in records if record.get('write_date')]
+    if write_dates:
+        _set_state(conn, 'last_write_date', max(write_dates + [last_write_date or '']))
+
+    # Deleted, merged and archived leads never show up in the write_date delta,
+    # so compare against the live id list (ids only, no field payload)
+    try:
+        live_ids = odoo.search("crm.lead", [])
+    except OdooError as e:
+        print(f"Failed to prune CRM mirror. {e}")
+        return False
+
+    conn.execute("CREATE TEMP TABLE IF NOT EXISTS live_ids (id INTEGER PRIMARY KEY)")
+    conn.execute("DELETE FROM live_ids")
+    conn.executemany("INSERT INTO live_ids (id) VALUES (?)", [(lead_id,) for lead_id in live_ids])
+    removed = conn.execute("DELETE FROM crm_lead WHERE id NOT IN (SELECT id FROM live_ids)").rowcount
+    conn.commit()
+
+    print(f"CRM mirror synced: {len(records)} changed, {removed} removed, {len(live_ids)} total leads.")
+    return True
+
+def find_leads_by_phone(conn, phone):
+    """Return the mirrored leads whose normalized phone equals `phone`"""
+    rows = conn.execute(
+        "SELECT * FROM crm_lead WHERE phone_normalized = ? ORDER BY id",
+        (normalize_phone(phone),)
+    ).fetchall()
+    return [dict(row) for row in rows]
+
+def find_lead_by_email(conn, email):
+    """Return the newest mirrored lead with this email address, or None"""
+    email = normalize_email(email)
+    if not email:
+        return None
+    row = conn.execute(
+        "SELECT * FROM crm_lead WHERE email_normalized = ? ORDER BY id DESC LIMIT 1",
+        (email,)
+    ).fetchone()
+    return dict(row) if row else None
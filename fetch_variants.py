@@ -1,12 +1,11 @@
 import os
-import requests
-import json
-import gspread
-from google.oauth2.service_account import Credentials
 import traceback
 import string
 from datetime import datetime
 
+from odoo_client import OdooClient, OdooError
+from sheets_cache import get_client, open_worksheet
+
 # Environment variables
 ODOO_URL = os.environ.get('ODOO_URL')
 DB = os.environ.get('ODOO_DB')
@@ -20,102 +19,63 @@ SCOPES = ['https://www.googleapis.com/auth/spreadsheets']
 SERVICE_ACCOUNT_FILE = 'service_account.json'
 
 def authenticate_odoo():
-    """Authenticate to Odoo and return session_id"""
-    headers = {"Content-Type": "application/json"}
-    auth_data = {
-        "jsonrpc": "2.0",
-        "params": {
-            "db": DB,
-            "login": LOGIN,
-            "password": PASSWORD
-        }
-    }
-    response = requests.post(f"{ODOO_URL}/web/session/authenticate", data=json.dumps(auth_data), headers=headers)
-    if response.status_code == 200 and "result" in response.json():
-        print("✓ Authenticated to Odoo")
-        return response.cookies
-    else:
-        print(f"✗ Odoo auth failed: {response.text}")
+    """Authenticate to Odoo and return a client holding the session"""
+    odoo = OdooClient(ODOO_URL, DB, LOGIN, PASSWORD)
+    try:
+        odoo.authenticate()
+    except OdooError as e:
+        print(f"✗ Odoo auth failed: {e}")
         return None
+    print("✓ Authenticated to Odoo")
+    return odoo
 
 def get_product_name():
     """Get product name from spreadsheet cell B1"""
-    credentials = Credentials.from_service_account_file(SERVICE_ACCOUNT_FILE, scopes=SCOPES)
-    gc = gspread.authorize(credentials)
-    sheet = gc.open_by_key(SPREADSHEET_ID).worksheet(WORKSHEET_NAME)
+    gc = get_client(SERVICE_ACCOUNT_FILE, SCOPES)
+    sheet = open_worksheet(gc, SPREADSHEET_ID, WORKSHEET_NAME)
     product_name = sheet.acell('B1').value
     print(f"Read product name from sheet: {product_name}")
     return product_name
 
-def get_template_by_name(session, product_name):
+def get_template_by_name(odoo, product_name):
     """Find product template by name"""
-    headers = {"Content-Type": "application/json"}
-    data = {
-        "jsonrpc": "2.0",
-        "params": {
-            "model": "product.template",
-            "method": "search_read",
-            "args": [
-                [["name", "=", product_name]],
-                ["id", "name", "product_variant_ids"]
-            ],
-            "kwargs": {}
-        }
-    }
-    response = session.post(f"{ODOO_URL}/web/dataset/call_kw", data=json.dumps(data), headers=headers)
-    result = response.json().get("result", [])
+    result = odoo.search_read(
+        "product.template",
+        [["name", "=", product_name]],
+        ["id", "name", "product_variant_ids"]
+    )
     if result:
         print(f"✓ Found template: {result[0]['name']} with ID: {result[0]['id']}")
         return result[0]
     print(f"✗ No template found for: {product_name}")
     return None
 
-def get_variants(session, template_id):
+def get_variants(odoo, template_id):
     """Get all variant data for a template"""
-    headers = {"Content-Type": "application/json"}
-    data = {
-        "jsonrpc": "2.0",
-        "params": {
-            "model": "product.product",
-            "method": "search_read",
-            "args": [
-                [["product_tmpl_id", "=", template_id]],
-                # Include all the fields you need
-                [
-                    "id", "name", "display_name", "default_code", "product_template_variant_value_ids",
-                    "detailed_type", "lst_price", "standard_price", "weight", "sales_count",
-                    "length", "width", "height", "freight_class", "package_type", "ship_method",
-                    "product_tag_ids", "route_ids", "categ_id", "x_studio_bin_location",
-                    "sale_ok", "purchase_ok", "allow_out_of_stock_order"
-                ]
-            ],
-            "kwargs": {}
-        }
-    }
-    response = session.post(f"{ODOO_URL}/web/dataset/call_kw", data=json.dumps(data), headers=headers)
-    variants = response.json().get("result", [])
+    variants = odoo.search_read(
+        "product.product",
+        [["product_tmpl_id", "=", template_id]],
+        # Include all the fields you need
+        [
+            "id", "name", "display_name", "default_code", "product_template_variant_value_ids",
+            "detailed_type", "lst_price", "standard_price", "weight", "sales_count",
+            "length", "width", "height", "freight_class", "package_type", "ship_method",
+            "product_tag_ids", "route_ids", "categ_id", "x_studio_bin_location",
+            "sale_ok", "purchase_ok", "allow_out_of_stock_order"
+        ]
+    )
     print(f"✓ Found {len(variants)} variants")
     return variants
 
-def get_attribute_values(session, attribute_ids):
+def get_attribute_values(odoo, attribute_ids):
     """Get attribute value details"""
     if not attribute_ids:
         return {}
-    headers = {"Content-Type": "application/json"}
-    data = {
-        "jsonrpc": "2.0",
-        "params": {
-            "model": "product.template.attribute.value",
-            "method": "search_read",
-            "args": [
-                [["id", "in", attribute_ids]],
-                ["id", "name", "display_name", "attribute_id"]
-            ],
-            "kwargs": {}
-        }
-    }
-    response = session.post(f"{ODOO_URL}/web/dataset/call_kw", data=json.dumps(data), headers=headers)
-    results = response.json().get("result", [])
+    results = odoo.search_read(
+        "product.template.attribute.value",
+        [["id", "in", attribute_ids]],
+        ["id", "name", "display_name", "attribute_id"]
+    )
     print(f"✓ Found {len(results)} attribute values")
     
     # Convert to dictionary for easy lookup
@@ -124,25 +84,15 @@ def get_attribute_values(session, attribute_ids):
         values[val['id']] = val
     return values
 
-def get_product_tags(session, tag_ids):
+def get_product_tags(odoo, tag_ids):
     """Get product tag details"""
     if not tag_ids:
         return {}
-    headers = {"Content-Type": "application/json"}
-    data = {
-        "jsonrpc": "2.0",
-        "params": {
-            "model": "product.tag",
-            "method": "search_read",
-            "args": [
-                [["id", "in", tag_ids]],
-                ["id", "name"]
-            ],
-            "kwargs": {}
-        }
-    }
-    response = session.post(f"{ODOO_URL}/web/dataset/call_kw", data=json.dumps(data), headers=headers)
-    results = response.json().get("result", [])
+    results = odoo.search_read(
+        "product.tag",
+        [["id", "in", tag_ids]],
+        ["id", "name"]
+    )
     
     # Convert to dictionary
     tags = {}
@@ -160,9 +110,8 @@ def column_letter(n):
 
 def update_sheet(template, variants, attributes):
     """Update the spreadsheet with product data"""
-    credentials = Credentials.from_service_account_file(SERVICE_ACCOUNT_FILE, scopes=SCOPES)
-    gc = gspread.authorize(credentials)
-    sheet = gc.open_by_key(SPREADSHEET_ID).worksheet(WORKSHEET_NAME)
+    gc = get_client(SERVICE_ACCOUNT_FILE, SCOPES)
+    sheet = open_worksheet(gc, SPREADSHEET_ID, WORKSHEET_NAME)
     
     # Update template info in first rows
     if template:
@@ -257,24 +206,20 @@ def main():
             return
         
         # Authenticate to Odoo
-        cookies = authenticate_odoo()
-        if not cookies:
+        odoo = authenticate_odoo()
+        if not odoo:
             print("✗ Failed to authenticate to Odoo")
             return
         
-        # Create session with cookies
-        session = requests.Session()
-        session.cookies.update(cookies)
-        
         # Get product template
-        template = get_template_by_name(session, product_name)
+        template = get_template_by_name(odoo, product_name)
         if not template:
             print(f"✗ Product template not found: {product_name}")
             update_sheet(None, [], {})
             return
         
         # Get all variants
-        variants = get_variants(session, template['id'])
+        variants = get_variants(odoo, template['id'])
         
         # Collect all attribute IDs
         attr_ids = []
@@ -282,7 +227,7 @@ def main():
             attr_ids.extend(variant.get('product_template_variant_value_ids', []))
         
         # Get attribute details
-        attr_values = get_attribute_values(session, attr_ids)
+        attr_values = get_attribute_values(odoo, attr_ids)
         
         # Update spreadsheet
         update_sheet(template, variants, attr_values)
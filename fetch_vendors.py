@@ -1,11 +1,11 @@
 import os
-import requests
-import json
 import gspread
-from google.oauth2.service_account import Credentials
 import traceback
 import datetime
 
+from odoo_client import OdooClient, OdooError
+from sheets_cache import get_client, open_worksheet, add_worksheet
+
 # --- Configuration from environment variables ---
 SPREADSHEET_ID = os.environ.get('SPREADSHEET_ID', '1Cz3oKbwVBZ9R7JhqL5tKRbk-xRtbAknauXYTCarJrro')
 SOURCE_WORKSHEET_NAME = 'start'
@@ -20,28 +20,19 @@ PASSWORD = os.environ.get('ODOO_PASSWORD', "8uj#eck5")
 SCOPES = ['https://www.googleapis.com/auth/spreadsheets']
 
 def authenticate_odoo():
-    headers = {"Content-Type": "application/json"}
-    auth_data = {
-        "jsonrpc": "2.0",
-        "params": {
-            "db": DB,
-            "login": LOGIN,
-            "password": PASSWORD
-        }
-    }
-    response = requests.post(f"{ODOO_URL}/web/session/authenticate", data=json.dumps(auth_data), headers=headers)
-    if response.status_code == 200 and "result" in response.json():
-        print("Authenticated to Odoo")
-        return response.cookies.get('session_id')
-    else:
-        raise Exception(f"Odoo auth failed: {response.text}")
+    odoo = OdooClient(ODOO_URL, DB, LOGIN, PASSWORD)
+    try:
+        odoo.authenticate()
+    except OdooError as e:
+        raise Exception(f"Odoo auth failed: {e}")
+    print("Authenticated to Odoo")
+    return odoo
 
 def get_variants_from_sheet():
     """Read product variants from the source worksheet"""
     try:
-        credentials = Credentials.from_service_account_file(SERVICE_ACCOUNT_FILE, scopes=SCOPES)
-        gc = gspread.authorize(credentials)
-        sheet = gc.open_by_key(SPREADSHEET_ID).worksheet(SOURCE_WORKSHEET_NAME)
+        gc = get_client(SERVICE_ACCOUNT_FILE, SCOPES)
+        sheet = open_worksheet(gc, SPREADSHEET_ID, SOURCE_WORKSHEET_NAME)
         
         # Get the template name from cell B1
         template_name = sheet.acell('B1').value
@@ -93,105 +84,68 @@ def get_variants_from_sheet():
         traceback.print_exc()
         return [], None, None
 
-def get_supplier_info(session_id, product_ids):
+def get_supplier_info(odoo, product_ids):
     """Get supplier information for the given product IDs"""
     if not product_ids:
         return []
     
-    headers = {"Content-Type": "application/json", "Cookie": f"session_id={session_id}"}
-    data = {
-        "jsonrpc": "2.0",
-        "method": "call",
-        "params": {
-            "model": "product.supplierinfo",
-            "method": "search_read",
-            "args": [[["product_id", "in", product_ids]]],
-            "kwargs": {
-                "fields": [
-                    "id", "sequence", "partner_id", "product_id", "product_name", 
-                    "product_code", "date_start", "date_end", "min_qty",
-                    "product_uom", "price", "delay", "purchase_requisition_id",
-                    "company_id"
-                ]
-            }
-        }
-    }
-    
-    response = requests.post(f"{ODOO_URL}/web/dataset/call_kw/product.supplierinfo/search_read", 
-                           data=json.dumps(data), headers=headers)
-    
-    if response.status_code == 200:
-        results = response.json().get("result", [])
-        print(f"Fetched {len(results)} supplier info records")
-        return results
-    else:
-        print(f"Error fetching supplier info: {response.text}")
+    try:
+        results = odoo.search_read(
+            "product.supplierinfo",
+            [["product_id", "in", product_ids]],
+            [
+                "id", "sequence", "partner_id", "product_id", "product_name", 
+                "product_code", "date_start", "date_end", "min_qty",
+                "product_uom", "price", "delay", "purchase_requisition_id",
+                "company_id"
+            ]
+        )
+    except OdooError as e:
+        print(f"Error fetching supplier info: {e}")
         return []
 
-def get_external_ids(session_id, model, ids):
+    print(f"Fetched {len(results)} supplier info records")
+    return results
+
+def get_external_ids(odoo, model, ids):
     """Get external IDs for a given model and IDs"""
     if not ids:
         return {}
     
-    headers = {"Content-Type": "application/json", "Cookie": f"session_id={session_id}"}
-    data = {
-        "jsonrpc": "2.0",
-        "method": "call",
-        "params": {
-            "model": "ir.model.data",
-            "method": "search_read",
-            "args": [[["model", "=", model], ["res_id", "in", ids]]],
-            "kwargs": {
-                "fields": ["res_id", "module", "name", "complete_name"]
-            }
-        }
-    }
-    
-    response = requests.post(f"{ODOO_URL}/web/dataset/call_kw/ir.model.data/search_read", 
-                           data=json.dumps(data), headers=headers)
-    
     result = {}
-    if response.status_code == 200:
-        records = response.json().get("result", [])
-        print(f"Fetched {len(records)} external IDs for {model}")
-        
-        for record in records:
-            res_id = record.get('res_id')
-            if res_id:
-                module = record.get('module', '')
-                name = record.get('name', '')
-                result[res_id] = f"{module}.{name}"
+    try:
+        records = odoo.search_read(
+            "ir.model.data",
+            [["model", "=", model], ["res_id", "in", ids]],
+            ["res_id", "module", "name", "complete_name"]
+        )
+    except OdooError as e:
+        print(f"Error fetching external IDs for {model}: {e}")
+        return result
+
+    print(f"Fetched {len(records)} external IDs for {model}")
+    
+    for record in records:
+        res_id = record.get('res_id')
+        if res_id:
+            module = record.get('module', '')
+            name = record.get('name', '')
+            result[res_id] = f"{module}.{name}"
                 
     return result
 
-def get_uom_external_ids(session_id):
+def get_uom_external_ids(odoo):
     """Get all UoM external IDs"""
-    headers = {"Content-Type": "application/json", "Cookie": f"session_id={session_id}"}
-    data = {
-        "jsonrpc": "2.0",
-        "method": "call",
-        "params": {
-            "model": "uom.uom",
-            "method": "search_read",
-            "args": [[]],
-            "kwargs": {
-                "fields": ["id", "name"]
-            }
-        }
-    }
-    
-    response = requests.post(f"{ODOO_URL}/web/dataset/call_kw/uom.uom/search_read", 
-                           data=json.dumps(data), headers=headers)
-    
     uoms = []
-    if response.status_code == 200:
-        results = response.json().get("result", [])
-        uoms = results
-        print(f"Fetched {len(results)} UoMs")
+    try:
+        uoms = odoo.search_read("uom.uom", [], ["id", "name"])
+        print(f"Fetched {len(uoms)} UoMs")
+    except OdooError as e:
+        print(f"Error fetching UoMs: {e}")
     
     # Get external IDs for these UoMs
     uom_ids = [uom['id'] for uom in uoms]
-    external_ids = get_external_ids(session_id, "uom.uom", uom_ids)
+    external_ids = get_external_ids(odoo, "uom.uom", uom_ids)
     
     # Combine UoM info with external IDs
     uom_with_ext_ids = {}
@@ -223,19 +177,17 @@ def format_value(value, field_type="string"):
     
     return value
 
-def update_vendor_sheet(session_id, template_name, template_id, variants, supplier_info):
+def update_vendor_sheet(odoo, template_name, template_id, variants, supplier_info):
     """Update the vendor fetch worksheet with the collected data"""
     try:
-        credentials = Credentials.from_service_account_file(SERVICE_ACCOUNT_FILE, scopes=SCOPES)
-        gc = gspread.authorize(credentials)
+        gc = get_client(SERVICE_ACCOUNT_FILE, SCOPES)
         
         # Try to get the worksheet, create if it doesn't exist
         try:
-            sheet = gc.open_by_key(SPREADSHEET_ID).worksheet(TARGET_WORKSHEET_NAME)
+            sheet = open_worksheet(gc, SPREADSHEET_ID, TARGET_WORKSHEET_NAME)
         except gspread.exceptions.WorksheetNotFound:
             print(f"Creating new worksheet: {TARGET_WORKSHEET_NAME}")
-            spreadsheet = gc.open_by_key(SPREADSHEET_ID)
-            sheet = spreadsheet.add_worksheet(title=TARGET_WORKSHEET_NAME, rows=1000, cols=26)
+            sheet = add_worksheet(gc, SPREADSHEET_ID, TARGET_WORKSHEET_NAME, rows=1000, cols=26)
         
         # Clear the worksheet
         sheet.clear()
@@ -249,14 +201,14 @@ def update_vendor_sheet(session_id, template_name, template_id, variants, suppli
         
         # Get external IDs for vendors (partners)
         partner_ids = list(set([info['partner_id'][0] for info in supplier_info if isinstance(info.get('partner_id'), list) and info['partner_id']]))
-        partner_external_ids = get_external_ids(session_id, "res.partner", partner_ids)
+        partner_external_ids = get_external_ids(odoo, "res.partner", partner_ids)
         
         # Get UoM information
-        uom_info = get_uom_external_ids(session_id)
+        uom_info = get_uom_external_ids(odoo)
         
         # Get supplier record external IDs
         supplier_record_ids = [info['id'] for info in supplier_info]
-        supplier_external_ids = get_external_ids(session_id, "product.supplierinfo", supplier_record_ids)
+        supplier_external_ids = get_external_ids(odoo, "product.supplierinfo", supplier_record_ids)
         
         # Create the headers for the supplier info table
         headers = [
@@ -382,16 +334,16 @@ def main():
             return
             
         # Authenticate to Odoo
-        session_id = authenticate_odoo()
+        odoo = authenticate_odoo()
         
         # Get list of product IDs
         product_ids = [variant['id'] for variant in variants]
         
         # Get supplier information
-        supplier_info = get_supplier_info(session_id, product_ids)
+        supplier_info = get_supplier_info(odoo, product_ids)
         
         # Update the vendor sheet
-        update_vendor_sheet(session_id, template_name, template_id, variants, supplier_info)
+        update_vendor_sheet(odoo, template_name, template_id, variants, supplier_info)
         
         print("Vendor information fetching completed successfully.")
     except Exception as e:
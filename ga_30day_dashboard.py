@@ -4,6 +4,8 @@ import gspread
 from datetime import datetime, timedelta
 import os
 
+from sheets_batch import SheetBatch
+
 # Configuration - modified for GitHub Actions
 SERVICE_ACCOUNT_FILE = 'service_account.json'  # This file will be created by GitHub Actions
 SPREADSHEET_ID = os.environ.get('SPREADSHEET_ID', '1nHciwKuK_G2wKd4G5i4Fo1gpMNJoscxaDt-LIGHH2EU')
@@ -586,94 +588,89 @@ def write_to_thirty_day_view(sheets, data):
         except gspread.exceptions.WorksheetNotFound:
             worksheet = sheet.add_worksheet(title='30-Day View', rows=100, cols=60)
         
-        # Clear existing data
-        worksheet.clear()
+        # Clear, write and format the sheet in one batch update
+        batch = SheetBatch(worksheet, template=True)
+        batch.clear()
         
-        # Write data (using named parameters to avoid deprecation warning)
-        worksheet.update(values=data, range_name="A1")
+        # Write data
+        batch.values(data)
         
         # Apply formatting
-        try:
-            # Format title
-            worksheet.format("A1:AZ1", {
-                "backgroundColor": {"red": 0.9, "green": 0.9, "blue": 0.9},
-                "textFormat": {"bold": True, "fontSize": 12},
-                "horizontalAlignment": "CENTER"
-            })
-            
-            # Format main header row
-            header_row = 3
-            worksheet.format(f"A{header_row}:AZ{header_row}", {
-                "textFormat": {"bold": True},
-                "backgroundColor": {"red": 0.8, "green": 0.8, "blue": 0.9},
-                "horizontalAlignment": "CENTER"
-            })
-            
-            # Format metric names column
-            worksheet.format("A4:A50", {"textFormat": {"bold": True}})
-            
-            # Format the Total/Avg column
-            metrics_count = 8
-            col_count = 30 + 2
-            total_col_letter = chr(64 + col_count) if col_count <= 26 else f"A{chr(64 + col_count - 26)}"
-            
-            worksheet.format(f"{total_col_letter}4:{total_col_letter}{4+metrics_count}", {
-                "backgroundColor": {"red": 0.95, "green": 0.95, "blue": 0.8},
-                "textFormat": {"bold": True}
-            })
-            
-            # Format the Change column
-            change_col_letter = chr(65 + col_count) if col_count < 25 else f"A{chr(65 + col_count - 26)}"
-            
-            worksheet.format(f"{change_col_letter}4:{change_col_letter}{4+metrics_count}", {
-                "backgroundColor": {"red": 0.95, "green": 0.8, "blue": 0.8},
-                "textFormat": {"bold": True}
-            })
-            
-            # Format daily changes section
-            daily_changes_row = 4 + metrics_count + 2
-            worksheet.format(f"A{daily_changes_row}", {
-                "backgroundColor": {"red": 0.9, "green": 0.9, "blue": 0.9},
-                "textFormat": {"bold": True}
-            })
-            
-            worksheet.format(f"A{daily_changes_row+1}:A{daily_changes_row+metrics_count}", {
-                "textFormat": {"bold": True, "italic": True}
-            })
-            
-            # Format chart data section
-            chart_data_row = daily_changes_row + metrics_count + 4
-            worksheet.format(f"A{chart_data_row}", {
-                "backgroundColor": {"red": 0.9, "green": 0.9, "blue": 0.9},
-                "textFormat": {"bold": True}
-            })
-            worksheet.format(f"A{chart_data_row+2}", {"textFormat": {"bold": True}})
-            
-            # Add conditional formatting for positive/negative changes
-            worksheet.conditional_format(f"B{4+metrics_count+1}:AZ{4+metrics_count+metrics_count}", {
-                "type": "TEXT_CONTAINS",
-                "values": [["↑"]],
-                "textFormat": {"foregroundColor": {"red": 0.0, "green": 0.6, "blue": 0.0}}
-            })
-            
-            worksheet.conditional_format(f"B{4+metrics_count+1}:AZ{4+metrics_count+metrics_count}", {
-                "type": "TEXT_CONTAINS",
-                "values": [["↓"]],
-                "textFormat": {"foregroundColor": {"red": 0.8, "green": 0.0, "blue": 0.0}}
-            })
-            
-            # Add borders
-            worksheet.format("A1:AZ100", {
-                "borders": {
-                    "top": {"style": "SOLID"},
-                    "bottom": {"style": "SOLID"},
-                    "left": {"style": "SOLID"},
-                    "right": {"style": "SOLID"}
-                }
-            })
-            
-        except Exception as f:
-            print(f"Note: Some formatting could not be applied: {f}")
+        # Format title
+        batch.format("A1:AZ1", {
+            "backgroundColor": {"red": 0.9, "green": 0.9, "blue": 0.9},
+            "textFormat": {"bold": True, "fontSize": 12},
+            "horizontalAlignment": "CENTER"
+        })
+        
+        # Format main header row
+        header_row = 3
+        batch.format(f"A{header_row}:AZ{header_row}", {
+            "textFormat": {"bold": True},
+            "backgroundColor": {"red": 0.8, "green": 0.8, "blue": 0.9},
+            "horizontalAlignment": "CENTER"
+        })
+        
+        # Format metric names column
+        batch.format("A4:A50", {"textFormat": {"bold": True}})
+        
+        # Format the Total/Avg column
+        metrics_count = 8
+        col_count = 30 + 2
+        total_col_letter = chr(64 + col_count) if col_count <= 26 else f"A{chr(64 + col_count - 26)}"
+        
+        batch.format(f"{total_col_letter}4:{total_col_letter}{4+metrics_count}", {
+            "backgroundColor": {"red": 0.95, "green": 0.95, "blue": 0.8},
+            "textFormat": {"bold": True}
+        })
+        
+        # Format the Change column
+        change_col_letter = chr(65 + col_count) if col_count < 25 else f"A{chr(65 + col_count - 26)}"
+        
+        batch.format(f"{change_col_letter}4:{change_col_letter}{4+metrics_count}", {
+            "backgroundColor": {"red": 0.95, "green": 0.8, "blue": 0.8},
+            "textFormat": {"bold": True}
+        })
+        
+        # Format daily changes section
+        daily_changes_row = 4 + metrics_count + 2
+        batch.format(f"A{daily_changes_row}", {
+            "backgroundColor": {"red": 0.9, "green": 0.9, "blue": 0.9},
+            "textFormat": {"bold": True}
+        })
+        
+        batch.format(f"A{daily_changes_row+1}:A{daily_changes_row+metrics_count}", {
+            "textFormat": {"bold": True, "italic": True}
+        })
+        
+        # Format chart data section
+        chart_data_row = daily_changes_row + metrics_count + 4
+        batch.format(f"A{chart_data_row}", {
+            "backgroundColor": {"red": 0.9, "green": 0.9, "blue": 0.9},
+            "textFormat": {"bold": True}
+        })
+        batch.format(f"A{chart_data_row+2}", {"textFormat": {"bold": True}})
+        
+        # Add conditional formatting for positive/negative changes
+        batch.conditional_format(f"B{4+metrics_count+1}:AZ{4+metrics_count+metrics_count}", "TEXT_CONTAINS", ["↑"], {
+            "textFormat": {"foregroundColor": {"red": 0.0, "green": 0.6, "blue": 0.0}}
+        })
+        
+        batch.conditional_format(f"B{4+metrics_count+1}:AZ{4+metrics_count+metrics_count}", "TEXT_CONTAINS", ["↓"], {
+            "textFormat": {"foregroundColor": {"red": 0.8, "green": 0.0, "blue": 0.0}}
+        })
+        
+        # Add borders
+        batch.format("A1:AZ100", {
+            "borders": {
+                "top": {"style": "SOLID"},
+                "bottom": {"style": "SOLID"},
+                "left": {"style": "SOLID"},
+                "right": {"style": "SOLID"}
+            }
+        })
+        
+        batch.send()
         
         print(f"Successfully updated '30-Day View' tab with dashboard data.")
         
@@ -694,94 +691,89 @@ def write_to_last_year_view(sheets, data):
         except gspread.exceptions.WorksheetNotFound:
             worksheet = sheet.add_worksheet(title='30-Day Last Year', rows=100, cols=60)
         
-        # Clear existing data
-        worksheet.clear()
+        # Clear, write and format the sheet in one batch update
+        batch = SheetBatch(worksheet, template=True)
+        batch.clear()
         
         # Write data
-        worksheet.update(values=data, range_name="A1")
+        batch.values(data)
         
         # Apply formatting (same as current year but with different colors)
-        try:
-            # Format title (using a different color scheme for last year)
-            worksheet.format("A1:AZ1", {
-                "backgroundColor": {"red": 0.8, "green": 0.9, "blue": 0.8},
-                "textFormat": {"bold": True, "fontSize": 12},
-                "horizontalAlignment": "CENTER"
-            })
-            
-            # Format main header row
-            header_row = 3
-            worksheet.format(f"A{header_row}:AZ{header_row}", {
-                "textFormat": {"bold": True},
-                "backgroundColor": {"red": 0.7, "green": 0.8, "blue": 0.7},
-                "horizontalAlignment": "CENTER"
-            })
-            
-            # Format metric names column
-            worksheet.format("A4:A50", {"textFormat": {"bold": True}})
-            
-            # Format the Total/Avg column
-            metrics_count = 8
-            col_count = 30 + 2
-            total_col_letter = chr(64 + col_count) if col_count <= 26 else f"A{chr(64 + col_count - 26)}"
-            
-            worksheet.format(f"{total_col_letter}4:{total_col_letter}{4+metrics_count}", {
-                "backgroundColor": {"red": 0.8, "green": 0.95, "blue": 0.8},
-                "textFormat": {"bold": True}
-            })
-            
-            # Format the Change column
-            change_col_letter = chr(65 + col_count) if col_count < 25 else f"A{chr(65 + col_count - 26)}"
-            
-            worksheet.format(f"{change_col_letter}4:{change_col_letter}{4+metrics_count}", {
-                "backgroundColor": {"red": 0.8, "green": 0.8, "blue": 0.95},
-                "textFormat": {"bold": True}
-            })
-            
-            # Format daily changes section
-            daily_changes_row = 4 + metrics_count + 2
-            worksheet.format(f"A{daily_changes_row}", {
-                "backgroundColor": {"red": 0.8, "green": 0.9, "blue": 0.8},
-                "textFormat": {"bold": True}
-            })
-            
-            worksheet.format(f"A{daily_changes_row+1}:A{daily_changes_row+metrics_count}", {
-                "textFormat": {"bold": True, "italic": True}
-            })
-            
-            # Format chart data section
-            chart_data_row = daily_changes_row + metrics_count + 4
-            worksheet.format(f"A{chart_data_row}", {
-                "backgroundColor": {"red": 0.8, "green": 0.9, "blue": 0.8},
-                "textFormat": {"bold": True}
-            })
-            worksheet.format(f"A{chart_data_row+2}", {"textFormat": {"bold": True}})
-            
-            # Add conditional formatting for positive/negative changes
-            worksheet.conditional_format(f"B{4+metrics_count+1}:AZ{4+metrics_count+metrics_count}", {
-                "type": "TEXT_CONTAINS",
-                "values": [["↑"]],
-                "textFormat": {"foregroundColor": {"red": 0.0, "green": 0.6, "blue": 0.0}}
-            })
-            
-            worksheet.conditional_format(f"B{4+metrics_count+1}:AZ{4+metrics_count+metrics_count}", {
-                "type": "TEXT_CONTAINS",
-                "values": [["↓"]],
-                "textFormat": {"foregroundColor": {"red": 0.8, "green": 0.0, "blue": 0.0}}
-            })
-            
-            # Add borders
-            worksheet.format("A1:AZ100", {
-                "borders": {
-                    "top": {"style": "SOLID"},
-                    "bottom": {"style": "SOLID"},
-                    "left": {"style": "SOLID"},
-                    "right": {"style": "SOLID"}
-                }
-            })
-            
-        except Exception as f:
-            print(f"Note: Some formatting could not be applied: {f}")
+        # Format title (using a different color scheme for last year)
+        batch.format("A1:AZ1", {
+            "backgroundColor": {"red": 0.8, "green": 0.9, "blue": 0.8},
+            "textFormat": {"bold": True, "fontSize": 12},
+            "horizontalAlignment": "CENTER"
+        })
+        
+        # Format main header row
+        header_row = 3
+        batch.format(f"A{header_row}:AZ{header_row}", {
+            "textFormat": {"bold": True},
+            "backgroundColor": {"red": 0.7, "green": 0.8, "blue": 0.7},
+            "horizontalAlignment": "CENTER"
+        })
+        
+        # Format metric names column
+        batch.format("A4:A50", {"textFormat": {"bold": True}})
+        
+        # Format the Total/Avg column
+        metrics_count = 8
+        col_count = 30 + 2
+        total_col_letter = chr(64 + col_count) if col_count <= 26 else f"A{chr(64 + col_count - 26)}"
+        
+        batch.format(f"{total_col_letter}4:{total_col_letter}{4+metrics_count}", {
+            "backgroundColor": {"red": 0.8, "green": 0.95, "blue": 0.8},
+            "textFormat": {"bold": True}
+        })
+        
+        # Format the Change column
+        change_col_letter = chr(65 + col_count) if col_count < 25 else f"A{chr(65 + col_count - 26)}"
+        
+        batch.format(f"{change_col_letter}4:{change_col_letter}{4+metrics_count}", {
+            "backgroundColor": {"red": 0.8, "green": 0.8, "blue": 0.95},
+            "textFormat": {"bold": True}
+        })
+        
+        # Format daily changes section
+        daily_changes_row = 4 + metrics_count + 2
+        batch.format(f"A{daily_changes_row}", {
+            "backgroundColor": {"red": 0.8, "green": 0.9, "blue": 0.8},
+            "textFormat": {"bold": True}
+        })
+        
+        batch.format(f"A{daily_changes_row+1}:A{daily_changes_row+metrics_count}", {
+            "textFormat": {"bold": True, "italic": True}
+        })
+        
+        # Format chart data section
+        chart_data_row = daily_changes_row + metrics_count + 4
+        batch.format(f"A{chart_data_row}", {
+            "backgroundColor": {"red": 0.8, "green": 0.9, "blue": 0.8},
+            "textFormat": {"bold": True}
+        })
+        batch.format(f"A{chart_data_row+2}", {"textFormat": {"bold": True}})
+        
+        # Add conditional formatting for positive/negative changes
+        batch.conditional_format(f"B{4+metrics_count+1}:AZ{4+metrics_count+metrics_count}", "TEXT_CONTAINS", ["↑"], {
+            "textFormat": {"foregroundColor": {"red": 0.0, "green": 0.6, "blue": 0.0}}
+        })
+        
+        batch.conditional_format(f"B{4+metrics_count+1}:AZ{4+metrics_count+metrics_count}", "TEXT_CONTAINS", ["↓"], {
+            "textFormat": {"foregroundColor": {"red": 0.8, "green": 0.0, "blue": 0.0}}
+        })
+        
+        # Add borders
+        batch.format("A1:AZ100", {
+            "borders": {
+                "top": {"style": "SOLID"},
+                "bottom": {"style": "SOLID"},
+                "left": {"style": "SOLID"},
+                "right": {"style": "SOLID"}
+            }
+        })
+        
+        batch.send()
         
         print(f"Successfully updated '30-Day Last Year' tab with dashboard data.")
         
@@ -4,6 +4,8 @@ import gspread
 from datetime import datetime, timedelta
 import os
 
+from sheets_batch import SheetBatch
+
 # Configuration - modified for GitHub Actions
 SERVICE_ACCOUNT_FILE = 'service_account.json'
 SPREADSHEET_ID = '1nHciwKuK_G2wKd4G5i4Fo1gpMNJoscxaDt-LIGHH2EU'
@@ -124,12 +126,8 @@ def write_to_ga_ads_tab(sheets, data):
             worksheet = sheet.add_worksheet(title='ga_ads', rows=1000, cols=10)
             print("Created new 'ga_ads' worksheet")
         
-        # Clear existing data
-        worksheet.clear()
-        print("Cleared existing data from ga_ads tab")
-        
-        # Write data starting from A1
-        worksheet.update(values=data, range_name="A1")
+        # Clear existing data and write data starting from A1 in one batch update
+        SheetBatch(worksheet).clear().values(data).send()
         print(f"Successfully wrote {len(data)} rows to ga_ads tab")
         
         return True
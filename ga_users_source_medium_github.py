@@ -4,6 +4,8 @@ import gspread
 from datetime import datetime, timedelta
 import os
 
+from sheets_batch import SheetBatch
+
 # Configuration - modified for GitHub Actions
 SERVICE_ACCOUNT_FILE = 'service_account.json'
 SPREADSHEET_ID = '1nHciwKuK_G2wKd4G5i4Fo1gpMNJoscxaDt-LIGHH2EU'
@@ -113,40 +115,36 @@ def write_to_ga_users_tab(sheets, data):
             worksheet = sheet.add_worksheet(title='ga_users', rows=1000, cols=10)
             print("Created new 'ga_users' worksheet")
         
-        # Clear existing data
-        worksheet.clear()
-        print("Cleared existing data from ga_users tab")
+        # Clear, write and format the sheet in one batch update
+        batch = SheetBatch(worksheet)
+        batch.clear()
         
         # Write data starting from A1
-        worksheet.update(values=data, range_name="A1")
-        print(f"Successfully wrote {len(data)} rows to ga_users tab")
+        batch.values(data)
         
         # Apply basic formatting
-        try:
-            # Format header row
-            worksheet.format("A1:E1", {
-                "textFormat": {"bold": True},
-                "backgroundColor": {"red": 0.8, "green": 0.8, "blue": 0.9}
-            })
-            
-            # Format date columns
-            data_end_row = len(data)
-            worksheet.format(f"A2:A{data_end_row}", {
-                "numberFormat": {"type": "DATE", "pattern": "yyyy-mm-dd"}
-            })
-            worksheet.format(f"E2:E{data_end_row}", {
-                "numberFormat": {"type": "DATE", "pattern": "yyyy-mm-dd"}
-            })
-            
-            # Format users column (numbers)
-            worksheet.format(f"B2:B{data_end_row}", {
-                "numberFormat": {"type": "NUMBER", "pattern": "#,##0"}
-            })
-            
-        except Exception as f:
-            print(f"Note: Some formatting could not be applied: {f}")
-        
-        print(f"Successfully updated 'ga_users' tab")
+        # Format header row
+        batch.format("A1:E1", {
+            "textFormat": {"bold": True},
+            "backgroundColor": {"red": 0.8, "green": 0.8, "blue": 0.9}
+        })
+        
+        # Format date columns
+        data_end_row = len(data)
+        batch.format(f"A2:A{data_end_row}", {
+            "numberFormat": {"type": "DATE", "pattern": "yyyy-mm-dd"}
+        })
+        batch.format(f"E2:E{data_end_row}", {
+            "numberFormat": {"type": "DATE", "pattern": "yyyy-mm-dd"}
+        })
+        
+        # Format users column (numbers)
+        batch.format(f"B2:B{data_end_row}", {
+            "numberFormat": {"type": "NUMBER", "pattern": "#,##0"}
+        })
+        
+        batch.send()
+        print(f"Successfully wrote {len(data)} rows to ga_users tab")
         
         return True
         
@@ -1,9 +1,25 @@
 import os
+import random
+import threading
 import openai
 import gspread
-from google.oauth2.service_account import Credentials
+from gspread.utils import absolute_range_name
+import time
 import traceback
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from functools import lru_cache
+
+try:
+    import tiktoken
+except ImportError:  # token counts fall back to a characters / 4 estimate
+    tiktoken = None
+
+from google.oauth2.service_account import Credentials
+
+from gpt_cache import ResponseCache
+from sheets_cache import get_client, open_spreadsheet, open_worksheet, add_worksheet
+from support_docs import SupportDocuments, fit_to_budget
 
 # Configuration
 SERVICE_ACCOUNT_FILE = 'service_account.json'
@@ -15,109 +31,212 @@ OTHER_FILES_WORKSHEET_NAME = 'gpt_other_files'
 PROMPT_WORKSHEET_NAME = 'prompt'
 
 SCOPES = ['https://www.googleapis.com/auth/spreadsheets']
+# Support files in Google Docs, Sheets, Slides and Drive are read with the same service account
+DRIVE_SCOPES = ['https://www.googleapis.com/auth/drive.readonly']
+
+DEFAULT_PROMPT = "Based on the above instructions and data, please provide your analysis and recommendations."
+
+GPT_MODEL = os.environ.get('GPT_MODEL', 'gpt-4-turbo-preview')  # GPT-4 Turbo for its larger context window
+# Contexts estimated above this many tokens are split into chunks of the CSV data
+GPT_MAX_CONTEXT_TOKENS = int(os.environ.get('GPT_MAX_CONTEXT_TOKENS', '100000'))
+# Target size of each chunked request, including instructions and prompt
+GPT_CHUNK_TOKENS = int(os.environ.get('GPT_CHUNK_TOKENS', '30000'))
+# Chunk requests sent to GPT at the same time
+GPT_MAP_WORKERS = int(os.environ.get('GPT_MAP_WORKERS', '4'))
+# Stream the answer into the data tab as it is generated
+GPT_STREAM = os.environ.get('GPT_STREAM', '0') == '1'
+# Least seconds between two partial writes of a streamed answer
+GPT_STREAM_FLUSH_SECONDS = float(os.environ.get('GPT_STREAM_FLUSH_SECONDS', '5'))
+# Tokens of support file text added to the context (0 sends the links only)
+GPT_SUPPORT_DOCS_TOKENS = int(os.environ.get('GPT_SUPPORT_DOCS_TOKENS', '20000'))
+# Batch mode: answer every row of the prompt tab as a separate job
+GPT_BATCH = os.environ.get('GPT_BATCH', '0') == '1'
+# Batch jobs sent to GPT at the same time
+GPT_BATCH_CONCURRENCY = int(os.environ.get('GPT_BATCH_CONCURRENCY', '4'))
+# Most GPT requests started per minute in batch mode (0 means no limit)
+GPT_REQUESTS_PER_MINUTE = float(os.environ.get('GPT_REQUESTS_PER_MINUTE', '60'))
+# Retries of a batch job that was rate limited (HTTP 429)
+GPT_MAX_RETRIES = int(os.environ.get('GPT_MAX_RETRIES', '5'))
 
 def authenticate_sheets():
     """Authenticate with Google Sheets"""
     try:
-        credentials = Credentials.from_service_account_file(SERVICE_ACCOUNT_FILE, scopes=SCOPES)
-        gc = gspread.authorize(credentials)
+        gc = get_client(SERVICE_ACCOUNT_FILE, SCOPES)
         print("✓ Successfully authenticated with Google Sheets")
         return gc
     except Exception as e:
         print(f"✗ Error authenticating with Google Sheets: {e}")
         return None
 
+def csv_data_from_values(all_values):
+    """Format the gpt_ss_data values as CSV-like text for GPT"""
+    if all_values:
+        print(f"✓ Found CSV data: {len(all_values)} rows")
+        
+        # Pad rows to the same width, as get_all_values does
+        width = max(len(row) for row in all_values)
+        csv_text = "\n".join([",".join(row + [''] * (width - len(row))) for row in all_values])
+        return csv_text
+    else:
+        print("✓ No CSV data found")
+        return None
+
 def get_csv_data(sheets_client):
     """Get CSV data from the gpt_ss_data tab"""
     try:
-        spreadsheet = sheets_client.open_by_key(SPREADSHEET_ID)
-        csv_worksheet = spreadsheet.worksheet(CSV_DATA_WORKSHEET_NAME)
+        csv_worksheet = open_worksheet(sheets_client, SPREADSHEET_ID, CSV_DATA_WORKSHEET_NAME)
         
         # Get all values from the CSV tab
-        all_values = csv_worksheet.get_all_values()
-        
-        if all_values:
-            print(f"✓ Found CSV data: {len(all_values)} rows")
-            
-            # Format as CSV-like text for GPT
-            csv_text = "\n".join([",".join(row) for row in all_values])
-            return csv_text
-        else:
-            print("✓ No CSV data found")
-            return None
+        return csv_data_from_values(csv_worksheet.get_all_values())
             
     except Exception as e:
         print(f"✗ Error getting CSV data: {e}")
         return None
 
+def file_links_from_values(all_values):
+    """Collect the support file links in column A of gpt_other_files, below the header"""
+    file_links = []
+    for i, row in enumerate(all_values):
+        if i == 0:  # Skip header row
+            continue
+        if row and row[0]:  # If there's content in column A
+            file_links.append(row[0])
+    
+    if file_links:
+        print(f"✓ Found {len(file_links)} support file links")
+        return file_links
+    else:
+        print("✓ No support files found")
+        return []
+
 def get_other_files(sheets_client):
     """Get support file links from the gpt_other_files tab"""
     try:
-        spreadsheet = sheets_client.open_by_key(SPREADSHEET_ID)
-        files_worksheet = spreadsheet.worksheet(OTHER_FILES_WORKSHEET_NAME)
+        files_worksheet = open_worksheet(sheets_client, SPREADSHEET_ID, OTHER_FILES_WORKSHEET_NAME)
         
         # Get all values starting from A2
-        all_values = files_worksheet.get_all_values()
-        
-        file_links = []
-        for i, row in enumerate(all_values):
-            if i == 0:  # Skip header row
-                continue
-            if row and row[0]:  # If there's content in column A
-                file_links.append(row[0])
-        
-        if file_links:
-            print(f"✓ Found {len(file_links)} support file links")
-            return file_links
-        else:
-            print("✓ No support files found")
-            return []
+        return file_links_from_values(files_worksheet.get_all_values())
             
     except Exception as e:
         print(f"✗ Error getting support files: {e}")
         return []
 
+def instructions_from_value(instruction):
+    """Check the instruction read from instructions!A1"""
+    if instruction:
+        print(f"✓ Found instructions: {len(instruction)} characters")
+        return instruction
+    else:
+        print("✓ No instructions found in A1")
+        return None
+
 def get_instructions(sheets_client):
     """Get instructions from the instructions tab, cell A1"""
     try:
-        spreadsheet = sheets_client.open_by_key(SPREADSHEET_ID)
-        instructions_worksheet = spreadsheet.worksheet(INSTRUCTIONS_WORKSHEET_NAME)
+        instructions_worksheet = open_worksheet(sheets_client, SPREADSHEET_ID, INSTRUCTIONS_WORKSHEET_NAME)
         
         # Get the instruction from cell A1
-        instruction = instructions_worksheet.acell('A1').value
-        
-        if instruction:
-            print(f"✓ Found instructions: {len(instruction)} characters")
-            return instruction
-        else:
-            print("✓ No instructions found in A1")
-            return None
+        return instructions_from_value(instructions_worksheet.acell('A1').value)
             
     except Exception as e:
         print(f"✗ Error getting instructions: {e}")
         return None
 
+def custom_prompt_from_value(custom_prompt):
+    """Use the prompt read from prompt!A2, or the default one"""
+    if custom_prompt:
+        print(f"✓ Found custom prompt: {len(custom_prompt)} characters")
+        return custom_prompt
+    else:
+        print("✓ No custom prompt found in A2, using default")
+        return DEFAULT_PROMPT
+
+def prompts_from_values(values):
+    """Collect the batch prompts from column A of the prompt tab, one job per non-empty row"""
+    prompts = [row[0] for row in values if row and row[0].strip()]
+    if prompts:
+        print(f"✓ Found {len(prompts)} prompts")
+    else:
+        print("✓ No prompts found in column A")
+    return prompts
+
+def get_prompts(sheets_client):
+    """Get every prompt from the prompt tab, column A from A2 down"""
+    try:
+        prompt_worksheet = open_worksheet(sheets_client, SPREADSHEET_ID, PROMPT_WORKSHEET_NAME)
+        return prompts_from_values([[value] for value in prompt_worksheet.col_values(1)[1:]])
+            
+    except Exception as e:
+        print(f"✗ Error getting prompts: {e}")
+        return []
+
 def get_custom_prompt(sheets_client):
     """Get custom prompt from the prompt tab, cell A2"""
     try:
-        spreadsheet = sheets_client.open_by_key(SPREADSHEET_ID)
-        prompt_worksheet = spreadsheet.worksheet(PROMPT_WORKSHEET_NAME)
+        prompt_worksheet = open_worksheet(sheets_client, SPREADSHEET_ID, PROMPT_WORKSHEET_NAME)
         
         # Get the prompt from cell A2
-        custom_prompt = prompt_worksheet.acell('A2').value
-        
-        if custom_prompt:
-            print(f"✓ Found custom prompt: {len(custom_prompt)} characters")
-            return custom_prompt
-        else:
-            print("✓ No custom prompt found in A2, using default")
-            return "Based on the above instructions and data, please provide your analysis and recommendations."
+        return custom_prompt_from_value(prompt_worksheet.acell('A2').value)
             
     except Exception as e:
         print(f"✗ Error getting custom prompt: {e}")
-        return "Based on the above instructions and data, please provide your analysis and recommendations."
+        return DEFAULT_PROMPT
+
+def load_context(sheets_client, batch=False):
+    """Get the instructions, CSV data, support file links and custom prompt with one batch read.
 
-def build_full_context(instructions, csv_data, file_links, custom_prompt):
+    With `batch` the last item is the list of every prompt in column A
+    instead. Falls back to reading the tabs one by one if the batch read
+    fails (for example when one of the tabs is missing).
+    """
+    ranges = [
+        absolute_range_name(INSTRUCTIONS_WORKSHEET_NAME, 'A1'),
+        absolute_range_name(CSV_DATA_WORKSHEET_NAME),
+        absolute_range_name(OTHER_FILES_WORKSHEET_NAME),
+        absolute_range_name(PROMPT_WORKSHEET_NAME, 'A2:A' if batch else 'A2')
+    ]
+    try:
+        spreadsheet = open_spreadsheet(sheets_client, SPREADSHEET_ID)
+        value_ranges = spreadsheet.values_batch_get(ranges)['valueRanges']
+    except Exception as e:
+        print(f"✗ Error reading context in one request, reading tabs one by one: {e}")
+        return (
+            get_instructions(sheets_client),
+            get_csv_data(sheets_client),
+            get_other_files(sheets_client),
+            get_prompts(sheets_client) if batch else get_custom_prompt(sheets_client)
+        )
+
+    instructions_values, csv_values, files_values, prompt_values = [
+        value_range.get('values', []) for value_range in value_ranges
+    ]
+    print(f"✓ Read {len(ranges)} context ranges in one request")
+    return (
+        instructions_from_value(instructions_values[0][0] if instructions_values and instructions_values[0] else None),
+        csv_data_from_values(csv_values),
+        file_links_from_values(files_values),
+        prompts_from_values(prompt_values) if batch
+        else custom_prompt_from_value(prompt_values[0][0] if prompt_values and prompt_values[0] else None)
+    )
+
+def get_support_documents(file_links):
+    """Download the support files and trim their text to GPT_SUPPORT_DOCS_TOKENS; returns {link: text}"""
+    if not file_links or GPT_SUPPORT_DOCS_TOKENS <= 0:
+        return {}
+    try:
+        credentials = Credentials.from_service_account_file(SERVICE_ACCOUNT_FILE, scopes=DRIVE_SCOPES)
+    except Exception as e:
+        print(f"✗ Can't load the service account for Google support files: {e}")
+        credentials = None
+    documents = SupportDocuments(credentials=credentials).fetch_all(file_links)
+    print(f"✓ Read {len(documents)} of {len(file_links)} support files")
+    return fit_to_budget(documents, GPT_SUPPORT_DOCS_TOKENS, estimate_tokens)
+
+def summarize_context(instructions, csv_data, file_links, custom_prompt):
+    """Create the context summary logged next to each answer"""
+    return f"Instructions: {'Yes' if instructions else 'No'}, CSV: {'Yes' if csv_data else 'No'}, Files: {len(file_links)}, Prompt: {'Custom' if custom_prompt != DEFAULT_PROMPT else 'Default'}"
+
+def build_full_context(instructions, csv_data, file_links, custom_prompt, documents=None):
     """Build the complete context for GPT including all data and files"""
     context_parts = []
     
@@ -138,6 +257,9 @@ def build_full_context(instructions, csv_data, file_links, custom_prompt):
         context_parts.append("SUPPORT FILES:")
         for i, link in enumerate(file_links, 1):
             context_parts.append(f"File {i}: {link}")
+            if documents and link in documents:
+                context_parts.append(documents[link])
+                context_parts.append("")
         context_parts.append("")
     
     # Add the custom prompt from A2
@@ -145,75 +267,320 @@ def build_full_context(instructions, csv_data, file_links, custom_prompt):
     
     return "\n".join(context_parts)
 
+@lru_cache(maxsize=None)
+def _encoding():
+    try:
+        return tiktoken.encoding_for_model(GPT_MODEL)
+    except KeyError:
+        return tiktoken.get_encoding('cl100k_base')
+
+def estimate_tokens(text):
+    """Count the tokens of `text` with tiktoken, or estimate them when it isn't installed"""
+    if tiktoken is not None:
+        return len(_encoding().encode(text))
+    return len(text) // 4 + 1
+
+def get_openai_client():
+    """Set up the OpenAI client from the OPENAI_API_KEY environment variable"""
+    api_key = os.environ.get('OPENAI_API_KEY')
+    if not api_key:
+        raise ValueError("Missing OPENAI_API_KEY environment variable")
+    return openai.OpenAI(api_key=api_key)
+
+def request_completion(client, content):
+    """Send one user message to GPT and return the answer text"""
+    response = client.chat.completions.create(
+        model=GPT_MODEL,
+        messages=[
+            {"role": "user", "content": content}
+        ],
+        #max_tokens=1000
+    )
+    return response.choices[0].message.content.strip()
+
 def ask_gpt_with_context(full_context):
     """Ask GPT with the complete context"""
     try:
-        # Get API key from environment
-        api_key = os.environ.get('OPENAI_API_KEY')
-        if not api_key:
-            raise ValueError("Missing OPENAI_API_KEY environment variable")
-        
-        # Set up OpenAI client
-        client = openai.OpenAI(api_key=api_key)
+        client = get_openai_client()
         
         print(f"✓ Sending {len(full_context)} characters to GPT")
         
         # Ask GPT with full context
-        response = client.chat.completions.create(
-            model="gpt-4-turbo-preview",  # Using GPT-4 Turbo for larger context window
+        gpt_response = request_completion(client, full_context)
+        print(f"✓ GPT responded: {gpt_response[:200]}...")
+        return gpt_response
+        
+    except Exception as e:
+        error_msg = f"Error asking GPT: {e}"
+        print(f"✗ {error_msg}")
+        return error_msg
+
+class RateLimiter:
+    """Space out request starts so at most `per_minute` begin in any minute; safe to share between threads"""
+
+    def __init__(self, per_minute):
+        self.interval = 60.0 / per_minute if per_minute > 0 else 0
+        self._lock = threading.Lock()
+        self._next_start = 0.0
+
+    def wait(self):
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next_start)
+            self._next_start = start + self.interval
+        time.sleep(start - now)
+
+def request_completion_with_retry(client, content, limiter):
+    """Send one request through `limiter`, retrying with backoff when GPT answers 429"""
+    for attempt in range(GPT_MAX_RETRIES + 1):
+        limiter.wait()
+        try:
+            return request_completion(client, content)
+        except openai.RateLimitError as e:
+            if attempt == GPT_MAX_RETRIES:
+                raise
+            # Honour Retry-After when the API sends it, otherwise back off exponentially
+            try:
+                delay = float(e.response.headers.get('retry-after'))
+            except (AttributeError, TypeError, ValueError):
+                delay = 2 ** attempt + random.random()
+            print(f"✗ Rate limited by GPT, retrying in {delay:.1f}s ({attempt + 1}/{GPT_MAX_RETRIES})")
+            time.sleep(delay)
+
+def ask_gpt_streaming(full_context, on_partial):
+    """Ask GPT with the complete context, streaming the answer.
+
+    `on_partial` receives the text generated so far, at most every
+    GPT_STREAM_FLUSH_SECONDS (the first piece right away).
+    """
+    parts = []
+    try:
+        client = get_openai_client()
+        
+        print(f"✓ Streaming {len(full_context)} characters to GPT")
+        
+        stream = client.chat.completions.create(
+            model=GPT_MODEL,
             messages=[
                 {"role": "user", "content": full_context}
             ],
-            #max_tokens=1000
+            stream=True
         )
         
-        gpt_response = response.choices[0].message.content.strip()
+        last_flush = 0
+        for chunk in stream:
+            if not chunk.choices or not chunk.choices[0].delta.content:
+                continue
+            parts.append(chunk.choices[0].delta.content)
+            if time.time() - last_flush >= GPT_STREAM_FLUSH_SECONDS:
+                on_partial("".join(parts))
+                last_flush = time.time()
+        
+        gpt_response = "".join(parts).strip()
         print(f"✓ GPT responded: {gpt_response[:200]}...")
         return gpt_response
         
+    except Exception as e:
+        error_msg = f"Error asking GPT: {e}"
+        print(f"✗ {error_msg}")
+        if parts:
+            error_msg += "\n\nPartial answer:\n" + "".join(parts)
+        return error_msg
+
+def split_csv_rows(csv_data, token_budget):
+    """Split CSV text into chunks of whole rows within `token_budget`; each chunk repeats the header row"""
+    rows = csv_data.split("\n")
+    header, body = rows[0], rows[1:]
+    header_tokens = estimate_tokens(header)
+
+    chunks = []
+    current, current_tokens = [], header_tokens
+    for row in body:
+        row_tokens = estimate_tokens(row) + 1
+        if current and current_tokens + row_tokens > token_budget:
+            chunks.append("\n".join([header] + current))
+            current, current_tokens = [], header_tokens
+        current.append(row)
+        current_tokens += row_tokens
+    if current or not chunks:
+        chunks.append("\n".join([header] + current))
+    return chunks
+
+def build_reduce_context(instructions, custom_prompt, partial_answers):
+    """Build the request that merges partial answers into one"""
+    context_parts = []
+    if instructions:
+        context_parts.append("MAIN INSTRUCTIONS:")
+        context_parts.append(instructions)
+        context_parts.append("")
+
+    context_parts.append(f"The CSV data was too large for one request, so it was analysed in {len(partial_answers)} parts.")
+    context_parts.append("PARTIAL ANSWERS:")
+    for i, answer in enumerate(partial_answers, 1):
+        context_parts.append(f"--- Part {i} ---")
+        context_parts.append(answer)
+        context_parts.append("")
+
+    context_parts.append(custom_prompt)
+    context_parts.append("Merge the partial answers above into one complete answer to this prompt, as if all the data had been analysed at once.")
+    return "\n".join(context_parts)
+
+def ask_gpt_chunked(instructions, csv_data, file_links, custom_prompt, documents=None,
+                    client=None, limiter=None, workers=GPT_MAP_WORKERS):
+    """Map-reduce over the CSV data when the full context is too large for one request.
+
+    The CSV rows are split into chunks that fit GPT_CHUNK_TOKENS together
+    with the instructions, files and prompt, and every chunk is analysed
+    (`workers` at a time). The partial answers are then merged with
+    reduce requests until a single answer is left. Batch mode passes its
+    `client` and `limiter`, so every map and reduce request is rate
+    limited and retried like its other requests.
+    """
+    try:
+        if client is None:
+            client = get_openai_client()
+
+        def complete(content):
+            if limiter is None:
+                return request_completion(client, content)
+            return request_completion_with_retry(client, content, limiter)
+
+        def map_prompt(part, parts):
+            return (f"{custom_prompt}\n\n(This request covers part {part} of {parts} of the CSV data. "
+                    "Answer for these rows only; the partial answers will be merged afterwards.)")
+
+        overhead = estimate_tokens(build_full_context(instructions, None, file_links, map_prompt(0, 0), documents))
+        chunks = split_csv_rows(csv_data, max(GPT_CHUNK_TOKENS - overhead, 1000))
+        print(f"✓ Context too large for one request, analysing the CSV data in {len(chunks)} chunks")
+
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = [
+                pool.submit(complete,
+                            build_full_context(instructions, chunk, file_links, map_prompt(i, len(chunks)), documents))
+                for i, chunk in enumerate(chunks, 1)
+            ]
+            partial_answers = []
+            for i, future in enumerate(futures, 1):
+                try:
+                    partial_answers.append(future.result())
+                    print(f"✓ GPT answered part {i} of {len(chunks)}")
+                except Exception as e:
+                    print(f"✗ Error asking GPT about part {i} of {len(chunks)}: {e}")
+
+            if not partial_answers:
+                raise ValueError("no chunk of the CSV data could be analysed")
+
+            # Merge in groups until everything fits in one reduce request
+            while len(partial_answers) > 1 and estimate_tokens(
+                    build_reduce_context(instructions, custom_prompt, partial_answers)) > GPT_CHUNK_TOKENS:
+                groups, group = [], []
+                for answer in partial_answers:
+                    if len(group) >= 2 and estimate_tokens(
+                            build_reduce_context(instructions, custom_prompt, group + [answer])) > GPT_CHUNK_TOKENS:
+                        groups.append(group)
+                        group = []
+                    group.append(answer)
+                groups.append(group)
+                print(f"✓ Merging {len(partial_answers)} partial answers in {len(groups)} groups")
+                partial_answers = list(pool.map(
+                    lambda group: complete(build_reduce_context(instructions, custom_prompt, group)),
+                    groups
+                ))
+
+        gpt_response = complete(build_reduce_context(instructions, custom_prompt, partial_answers))
+        print(f"✓ GPT responded: {gpt_response[:200]}...")
+        return gpt_response
+
     except Exception as e:
         error_msg = f"Error asking GPT: {e}"
         print(f"✗ {error_msg}")
         return error_msg
 
-def write_to_spreadsheet(sheets_client, gpt_response, context_summary):
-    """Write the GPT response to the data worksheet"""
+def open_data_worksheet(sheets_client):
+    """Get the data worksheet, creating it if it doesn't exist"""
     try:
-        # Open the spreadsheet and get the data worksheet
-        spreadsheet = sheets_client.open_by_key(SPREADSHEET_ID)
-        
-        # Try to get the data worksheet, create if it doesn't exist
-        try:
-            worksheet = spreadsheet.worksheet(DATA_WORKSHEET_NAME)
-            print(f"✓ Writing to existing worksheet: {worksheet.title}")
-        except gspread.exceptions.WorksheetNotFound:
-            worksheet = spreadsheet.add_worksheet(title=DATA_WORKSHEET_NAME, rows=100, cols=10)
-            print(f"✓ Created new worksheet: {worksheet.title}")
+        worksheet = open_worksheet(sheets_client, SPREADSHEET_ID, DATA_WORKSHEET_NAME)
+        print(f"✓ Writing to existing worksheet: {worksheet.title}")
+    except gspread.exceptions.WorksheetNotFound:
+        worksheet = add_worksheet(sheets_client, SPREADSHEET_ID, DATA_WORKSHEET_NAME, rows=100, cols=10)
+        print(f"✓ Created new worksheet: {worksheet.title}")
+    return worksheet
+
+def next_data_row(worksheet):
+    """Find the next empty row of the data worksheet and the header cells to write along with it"""
+    # Column A and the Cache header cell in one request
+    values, cache_header = worksheet.batch_get(['A:A', 'D1'])
+    next_row = len(values) + 1
+    
+    # Write headers if this is the first entry; older tabs only lack the Cache header
+    if next_row == 1:
+        return 2, [{'range': 'A1:D1', 'values': [['Timestamp', 'Context Summary', 'GPT Response', 'Cache']]}]
+    if cache_header.first() != 'Cache':
+        return next_row, [{'range': 'D1', 'values': [['Cache']]}]
+    return next_row, []
+
+def write_to_spreadsheet(sheets_client, gpt_response, context_summary, cache_hit=False):
+    """Write the GPT response to the data worksheet, noting whether it came from the cache"""
+    try:
+        worksheet = open_data_worksheet(sheets_client)
+        next_row, headers = next_data_row(worksheet)
         
         # Get current timestamp
         timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
         
-        # Find the next empty row
-        values = worksheet.col_values(1) if worksheet.col_values(1) else []
-        next_row = len(values) + 1
+        # Write the data together with the headers
+        row_data = [timestamp, context_summary, gpt_response, 'HIT' if cache_hit else 'MISS']
+        worksheet.batch_update(headers + [
+            {'range': f'A{next_row}:D{next_row}', 'values': [row_data]}
+        ])
         
-        # Write headers if this is the first entry
-        if next_row == 1:
-            headers = ['Timestamp', 'Context Summary', 'GPT Response']
-            worksheet.update(
-                values=[headers],
-                range_name='A1:C1'
-            )
-            next_row = 2
+        print(f"✓ Successfully wrote data to row {next_row}")
+        return True
         
-        # Write the data
-        row_data = [timestamp, context_summary, gpt_response]
-        worksheet.update(
-            values=[row_data],
-            range_name=f'A{next_row}:C{next_row}'
-        )
+    except Exception as e:
+        print(f"✗ Error writing to spreadsheet: {e}")
+        traceback.print_exc()
+        return False
+
+def reserve_data_row(sheets_client, context_summary):
+    """Write the timestamp and summary of a streamed answer to the next row; returns (worksheet, row) or None"""
+    try:
+        worksheet = open_data_worksheet(sheets_client)
+        next_row, headers = next_data_row(worksheet)
+        timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        worksheet.batch_update(headers + [
+            {'range': f'A{next_row}:D{next_row}', 'values': [[timestamp, context_summary, 'Waiting for GPT...', 'STREAMING']]}
+        ])
+        print(f"✓ Reserved row {next_row} for the streamed answer")
+        return worksheet, next_row
         
-        print(f"✓ Successfully wrote data to row {next_row}")
+    except Exception as e:
+        print(f"✗ Error reserving a row for the streamed answer: {e}")
+        return None
+
+def update_data_row(worksheet, row, gpt_response, status):
+    """Overwrite the answer and cache status of a reserved row"""
+    try:
+        worksheet.update(values=[[gpt_response, status]], range_name=f'C{row}:D{row}')
+        return True
+    except Exception as e:
+        print(f"✗ Error writing to row {row}: {e}")
+        return False
+
+def append_to_spreadsheet(sheets_client, rows):
+    """Append several answer rows to the data worksheet with one request"""
+    try:
+        worksheet = open_data_worksheet(sheets_client)
+        
+        # Write the missing headers first, then append below them
+        _, headers = next_data_row(worksheet)
+        if headers:
+            worksheet.batch_update(headers)
+        worksheet.append_rows(rows, value_input_option='RAW', table_range='A1')
+        
+        print(f"✓ Successfully appended {len(rows)} rows")
         return True
         
     except Exception as e:
@@ -221,6 +588,58 @@ def write_to_spreadsheet(sheets_client, gpt_response, context_summary):
         traceback.print_exc()
         return False
 
+def run_batch(sheets_client):
+    """Answer every prompt of the prompt tab as its own job and append all answers at once.
+
+    The instructions, CSV data and files are loaded once. Jobs run
+    GPT_BATCH_CONCURRENCY at a time, start at most GPT_REQUESTS_PER_MINUTE
+    requests a minute, and are retried when rate limited.
+    """
+    instructions, csv_data, file_links, prompts = load_context(sheets_client, batch=True)
+    if not prompts:
+        print("✗ No prompts to answer")
+        return False
+    documents = get_support_documents(file_links)
+    
+    # Retries are ours, so they go through the rate limiter too
+    client = get_openai_client().with_options(max_retries=0)
+    limiter = RateLimiter(GPT_REQUESTS_PER_MINUTE)
+    cache = ResponseCache()
+    
+    def answer(prompt):
+        full_context = build_full_context(instructions, csv_data, file_links, prompt, documents)
+        gpt_response = cache.get(GPT_MODEL, full_context)
+        if gpt_response is not None:
+            return gpt_response, True
+        
+        if csv_data and estimate_tokens(full_context) > GPT_MAX_CONTEXT_TOKENS:
+            # One chunk at a time, so the batch never has more than GPT_BATCH_CONCURRENCY requests in flight
+            gpt_response = ask_gpt_chunked(instructions, csv_data, file_links, prompt, documents,
+                                           client=client, limiter=limiter, workers=1)
+        else:
+            try:
+                gpt_response = request_completion_with_retry(client, full_context, limiter)
+            except Exception as e:
+                gpt_response = f"Error asking GPT: {e}"
+        
+        if gpt_response.startswith("Error asking GPT"):
+            print(f"✗ {gpt_response}")
+        else:
+            cache.put(GPT_MODEL, full_context, gpt_response)
+        return gpt_response, False
+    
+    print(f"✓ Answering {len(prompts)} prompts, {GPT_BATCH_CONCURRENCY} at a time")
+    with ThreadPoolExecutor(max_workers=GPT_BATCH_CONCURRENCY) as pool:
+        answers = list(pool.map(answer, prompts))
+    
+    timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    rows = [
+        [timestamp, f"{summarize_context(instructions, csv_data, file_links, prompt)}, Job {i}/{len(prompts)}: {prompt[:100]}",
+         gpt_response, 'HIT' if cache_hit else 'MISS']
+        for i, (prompt, (gpt_response, cache_hit)) in enumerate(zip(prompts, answers), 1)
+    ]
+    return append_to_spreadsheet(sheets_client, rows)
+
 def main():
     print("Starting GPT Health Check with Full Context...")
     print(f"Target spreadsheet: {SPREADSHEET_ID}")
@@ -231,23 +650,53 @@ def main():
         if not sheets_client:
             return False
         
+        if GPT_BATCH:
+            success = run_batch(sheets_client)
+            print("✓ GPT batch completed successfully!" if success else "✗ GPT batch failed")
+            return success
+        
         # Gather all context
-        instructions = get_instructions(sheets_client)
-        csv_data = get_csv_data(sheets_client)
-        file_links = get_other_files(sheets_client)
-        custom_prompt = get_custom_prompt(sheets_client)
+        instructions, csv_data, file_links, custom_prompt = load_context(sheets_client)
+        documents = get_support_documents(file_links)
         
         # Build full context for GPT
-        full_context = build_full_context(instructions, csv_data, file_links, custom_prompt)
+        full_context = build_full_context(instructions, csv_data, file_links, custom_prompt, documents)
         
         # Create summary for logging
-        context_summary = f"Instructions: {'Yes' if instructions else 'No'}, CSV: {'Yes' if csv_data else 'No'}, Files: {len(file_links)}, Prompt: {'Custom' if custom_prompt != 'Based on the above instructions and data, please provide your analysis and recommendations.' else 'Default'}"
+        context_summary = summarize_context(instructions, csv_data, file_links, custom_prompt)
         
-        # Ask GPT with complete context
-        gpt_response = ask_gpt_with_context(full_context)
+        # Reuse the answer of an identical earlier run
+        cache = ResponseCache()
+        gpt_response = cache.get(GPT_MODEL, full_context)
+        cache_hit = gpt_response is not None
+        chunked = bool(csv_data) and estimate_tokens(full_context) > GPT_MAX_CONTEXT_TOKENS
+        
+        # Streaming fills a reserved row as the answer arrives, so a crash still leaves the partial answer
+        reserved = None
+        if GPT_STREAM and not cache_hit and not chunked:
+            reserved = reserve_data_row(sheets_client, context_summary)
+        
+        if cache_hit:
+            print(f"✓ Using cached GPT response: {gpt_response[:200]}...")
+        # Otherwise ask GPT with complete context, in chunks if it is too large for one request
+        elif chunked:
+            gpt_response = ask_gpt_chunked(instructions, csv_data, file_links, custom_prompt, documents)
+        elif reserved:
+            worksheet, row = reserved
+            gpt_response = ask_gpt_streaming(
+                full_context, lambda text: update_data_row(worksheet, row, text, 'STREAMING')
+            )
+        else:
+            gpt_response = ask_gpt_with_context(full_context)
+        
+        if not cache_hit and not gpt_response.startswith("Error asking GPT"):
+            cache.put(GPT_MODEL, full_context, gpt_response)
         
         # Write to spreadsheet
-        success = write_to_spreadsheet(sheets_client, gpt_response, context_summary)
+        if reserved:
+            success = update_data_row(worksheet, row, gpt_response, 'MISS')
+        else:
+            success = write_to_spreadsheet(sheets_client, gpt_response, context_summary, cache_hit)
         
         if success:
             print("✓ GPT health check with full context completed successfully!")
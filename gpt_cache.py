@@ -0,0 +1,85 @@
+import hashlib
+import json
+import os
+import tempfile
+import time
+
+# Directory holding one file per cached GPT response
+GPT_CACHE_DIR = os.environ.get('GPT_CACHE_DIR', '.state/gpt_cache')
+# Hours a cached response is reused (0 turns the cache off)
+GPT_CACHE_TTL_HOURS = float(os.environ.get('GPT_CACHE_TTL_HOURS', '24'))
+# Size the cache directory is trimmed back to, oldest entries first
+GPT_CACHE_MAX_MB = float(os.environ.get('GPT_CACHE_MAX_MB', '50'))
+
+
+class ResponseCache:
+    """On-disk GPT response cache keyed by a hash of the model name and the full context.
+
+    Entries expire after `ttl_hours`. After every write, expired entries are
+    removed and the least recently used ones are evicted until the directory
+    is back under `max_mb`.
+    """
+
+    def __init__(self, cache_dir=GPT_CACHE_DIR, ttl_hours=GPT_CACHE_TTL_HOURS, max_mb=GPT_CACHE_MAX_MB):
+        self.cache_dir = cache_dir
+        self.ttl = ttl_hours * 3600
+        self.max_bytes = max_mb * 1024 * 1024
+
+    def _path(self, model, content):
+        digest = hashlib.sha256(f"{model}\0{content}".encode('utf-8')).hexdigest()
+        return os.path.join(self.cache_dir, f"{digest}.json")
+
+    def get(self, model, content):
+        """Return the cached response for this model and context, or None"""
+        if self.ttl <= 0:
+            return None
+        path = self._path(model, content)
+        try:
+            with open(path) as f:
+                entry = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+        if time.time() - entry['created_at'] >= self.ttl:
+            return None
+        try:
+            os.utime(path)  # Mark as recently used for eviction
+        except FileNotFoundError:
+            pass
+        return entry['response']
+
+    def put(self, model, content, response):
+        if self.ttl <= 0:
+            return
+        os.makedirs(self.cache_dir, exist_ok=True)
+        # A unique temp file per write, so concurrent writers never share one
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+        with os.fdopen(fd, 'w') as f:
+            json.dump({'model': model, 'created_at': time.time(), 'response': response}, f)
+        os.replace(tmp_path, self._path(model, content))
+        self._evict()
+
+    def _evict(self):
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith('.json'):
+                continue
+            path = os.path.join(self.cache_dir, name)
+            try:
+                stat = os.stat(path)
+                # Not used for a whole TTL, so it has certainly expired
+                if time.time() - stat.st_mtime >= self.ttl:
+                    os.remove(path)
+                    continue
+            except FileNotFoundError:  # Evicted by another writer meanwhile
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
@@ -1,11 +1,17 @@
-import requests
-import json
 import re
 from datetime import datetime, timedelta
-import gspread
-from google.oauth2.service_account import Credentials
+import hmac
 import os
+import threading
+import time
 import xmlrpc.client
+from gspread.utils import rowcol_to_a1
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from crm_mirror import open_mirror, sync_mirror, upsert_leads, find_lead_by_email, normalize_email
+from odoo_client import OdooClient, OdooError
+from sheets_cache import get_client, open_worksheet
+from utm_campaigns import CampaignResolver
 
 # Google Sheets Configuration
 SERVICE_ACCOUNT_FILE = 'service_account.json'
@@ -13,6 +19,23 @@ SPREADSHEET_ID = '1GB1uBtCM58cER-Dnf3M6K7MLCZKpvTl7USLu6ns3hB0'
 WORKSHEET_NAME = 'Form responses'
 PROCESSING_QUEUE_NAME = 'processing_queue'
 
+# Import every PENDING queue row per run instead of only the latest one
+LEAD_IMPORT_BATCH = os.environ.get('LEAD_IMPORT_BATCH', '0') == '1'
+# Read only this many of the newest Form responses rows (0 reads the whole sheet);
+# a lead not found in them falls back to a full read
+FORM_RESPONSES_TAIL_ROWS = int(os.environ.get('FORM_RESPONSES_TAIL_ROWS', '0'))
+
+# Worker mode: stay running, keep clients warm and import as soon as leads arrive
+LEAD_IMPORT_WORKER = os.environ.get('LEAD_IMPORT_WORKER', '0') == '1'
+# Seconds between cheap row-count checks of the processing queue
+LEAD_IMPORT_POLL_SECONDS = float(os.environ.get('LEAD_IMPORT_POLL_SECONDS', '15'))
+# Seconds after which the queue is read in full even if its row count didn't change
+LEAD_IMPORT_FULL_CHECK_SECONDS = float(os.environ.get('LEAD_IMPORT_FULL_CHECK_SECONDS', '300'))
+# Port of the local trigger endpoint (0 disables it) and the token callers must send;
+# without a token the endpoint only accepts connections from this host
+LEAD_IMPORT_HTTP_PORT = int(os.environ.get('LEAD_IMPORT_HTTP_PORT', '8080'))
+LEAD_IMPORT_TRIGGER_TOKEN = os.environ.get('LEAD_IMPORT_TRIGGER_TOKEN')
+
 # Odoo TEST credentials
 odoo_url = os.environ.get('ODOO_URL', 'https://odoo.optimacompanies.com/')
 db = os.environ.get('ODOO_DB', 'master')
@@ -25,6 +48,12 @@ xmlrpc_url = odoo_url.rstrip('/')
 # Salesperson assignment
 MICHAEL_BETANCOURT_USER_ID = 20
 
+# mail.activity.type scheduled on every imported lead
+ACTIVITY_TYPE_ID = 69
+
+# XML-RPC uid, object proxy and activity type, set up once per process
+_xmlrpc_state = {}
+
 # Map sources to IDs (adjust these for your QA environment)
 source_mapping = {
     "google": 308,
@@ -62,42 +91,33 @@ SCOPES = [
 def authenticate_google_sheets():
     """Authenticate with Google Sheets"""
     try:
-        credentials = Credentials.from_service_account_file(
-            SERVICE_ACCOUNT_FILE, scopes=SCOPES
-        )
-        gc = gspread.authorize(credentials)
-        return gc
+        return get_client(SERVICE_ACCOUNT_FILE, SCOPES)
     except Exception as e:
         print(f"Failed to authenticate with Google Sheets: {e}")
         return None
 
 def authenticate_odoo(url, db, login, password):
     """Authenticate with Odoo"""
-    headers = {"Content-Type": "application/json"}
-    auth_data = {
-        "jsonrpc": "2.0",
-        "params": {
-            "db": db,
-            "login": login,
-            "password": password
-        }
-    }
-    response = requests.post(url + "/web/session/authenticate", data=json.dumps(auth_data), headers=headers)
-    
-    if response.status_code == 200 and "result" in response.json():
-        print(f"✅ Successfully authenticated with Odoo TEST environment: {url}")
-        return response.cookies.get('session_id')
-    else:
-        print(f"❌ Failed to authenticate with Odoo TEST environment. Status Code: {response.status_code}")
+    odoo = OdooClient(url, db, login, password)
+    try:
+        odoo.authenticate()
+    except OdooError as e:
+        print(f"❌ Failed to authenticate with Odoo TEST environment. {e}")
         raise ValueError("Odoo authentication failed")
 
+    print(f"✅ Successfully authenticated with Odoo TEST environment: {url}")
+    return odoo
+
 def authenticate_xmlrpc():
-    """Authenticate with Odoo XML-RPC"""
+    """Authenticate with Odoo XML-RPC once per process and return the uid"""
+    if _xmlrpc_state.get('uid'):
+        return _xmlrpc_state['uid']
     try:
         common = xmlrpc.client.ServerProxy('{}/xmlrpc/2/common'.format(xmlrpc_url))
         uid = common.authenticate(db, login, password, {})
         if uid:
             print(f"✅ Successfully authenticated XML-RPC. User ID: {uid}")
+            _xmlrpc_state['uid'] = uid
             return uid
         else:
             print("❌ XML-RPC authentication failed")
@@ -106,44 +126,60 @@ def authenticate_xmlrpc():
         print(f"❌ XML-RPC authentication error: {e}")
         return None
 
+def get_xmlrpc_models():
+    """Return the shared XML-RPC object proxy; its transport keeps the connection open between calls"""
+    if 'models' not in _xmlrpc_state:
+        _xmlrpc_state['models'] = xmlrpc.client.ServerProxy('{}/xmlrpc/2/object'.format(xmlrpc_url))
+    return _xmlrpc_state['models']
+
+def get_activity_type(uid):
+    """Read the follow-up activity type once per process"""
+    if 'activity_type' not in _xmlrpc_state:
+        _xmlrpc_state['activity_type'] = get_xmlrpc_models().execute_kw(
+            db, uid, password, 'mail.activity.type', 'read', [[ACTIVITY_TYPE_ID]],
+            {'fields': ['name', 'sequence', 'delay_count', 'delay_unit',
+                        'icon', 'decoration_type', 'default_user_id', 'default_note']}
+        )[0]
+        print(f"✅ Activity type fetched: {_xmlrpc_state['activity_type']}")
+    return _xmlrpc_state['activity_type']
+
+def build_activity_data(activity_type, lead_id, user_id):
+    """Build the mail.activity values for one lead"""
+    return {
+        'res_id': lead_id,
+        'res_model_id': 707,  # crm.lead model ID
+        'res_model': 'crm.lead',
+        'activity_type_id': activity_type['id'],
+        'summary': activity_type['name'],
+        'user_id': user_id,
+        'note': activity_type['default_note'],
+        'date_deadline': (datetime.now() + 
+                          timedelta(days=activity_type['delay_count'], 
+                                   weeks=1 if activity_type['delay_unit'] == 'weeks' else 0)
+                         ).strftime('%Y-%m-%d')
+    }
+
 def create_activity_for_lead(lead_id, user_id):
     """Create activity for the lead using XML-RPC"""
     try:
-        # Authenticate XML-RPC
+        # Authenticate XML-RPC (only the first call per process logs in)
         uid = authenticate_xmlrpc()
         if not uid:
             return False
         
         # XML-RPC Object URL for calling methods
-        models = xmlrpc.client.ServerProxy('{}/xmlrpc/2/object'.format(xmlrpc_url))
+        models = get_xmlrpc_models()
         
-        # Fetch the activity type with ID 69
+        # Fetch the activity type (read once, then memoized)
         try:
-            activity_type = models.execute_kw(
-                db, uid, password, 'mail.activity.type', 'read', [[69]], 
-                {'fields': ['name', 'sequence', 'delay_count', 'delay_unit', 
-                            'icon', 'decoration_type', 'default_user_id', 'default_note']}
-            )[0]
-            print(f"✅ Activity type fetched: {activity_type}")
+            activity_type = get_activity_type(uid)
         except Exception as e:
             print(f"❌ Error fetching activity type: {e}")
             return False
 
         # Create the activity
         if activity_type:
-            activity_data = {
-                'res_id': lead_id,
-                'res_model_id': 707,  # crm.lead model ID
-                'res_model': 'crm.lead',
-                'activity_type_id': activity_type['id'],
-                'summary': activity_type['name'],
-                'user_id': user_id,
-                'note': activity_type['default_note'],
-                'date_deadline': (datetime.now() + 
-                                  timedelta(days=activity_type['delay_count'], 
-                                           weeks=1 if activity_type['delay_unit'] == 'weeks' else 0)
-                                 ).strftime('%Y-%m-%d')
-            }
+            activity_data = build_activity_data(activity_type, lead_id, user_id)
 
             try:
                 models.execute_kw(db, uid, password, 'mail.activity', 'create', [activity_data])
@@ -159,91 +195,41 @@ def create_activity_for_lead(lead_id, user_id):
         print(f"❌ Error in create_activity_for_lead: {e}")
         return False
 
-def get_or_create_campaign_id(url, session_id, campaign_name):
-    """Find or create a campaign by name in Odoo"""
-    if not campaign_name:
-        campaign_name = "Website Form Submission"
-    
-    headers = {
-        "Content-Type": "application/json",
-        "Cookie": f"session_id={session_id}"
-    }
-    
-    campaign_name = campaign_name.strip()
-    print(f"🔍 Searching for campaign: '{campaign_name}'")
-
-    # Search for existing campaign
-    search_data = {
-        "jsonrpc": "2.0",
-        "method": "call",
-        "params": {
-            "model": "utm.campaign",
-            "method": "search_read",
-            "args": [[["name", "=", campaign_name]]],
-            "kwargs": {
-                "fields": ["id", "name"],
-                "limit": 1
-            }
-        }
-    }
+def create_activities_for_leads(lead_ids, user_id):
+    """Create the activities for several leads with one multi-record create"""
+    if not lead_ids:
+        return True
+    try:
+        uid = authenticate_xmlrpc()
+        if not uid:
+            return False
 
-    response = requests.post(url + "/web/dataset/call_kw/utm.campaign/search_read", 
-                             data=json.dumps(search_data), headers=headers)
-    
-    if response.status_code == 200:
-        result = response.json().get("result", [])
-        if result:
-            print(f"✅ Found existing campaign: '{result[0]['name']}' (ID: {result[0]['id']})")
-            return result[0]['id']
-        else:
-            print(f"📝 Creating new campaign: '{campaign_name}'")
-            return create_campaign(url, session_id, campaign_name)
-    else:
-        print(f"❌ Failed to search campaign. Status Code: {response.status_code}")
-        return None
+        try:
+            activity_type = get_activity_type(uid)
+        except Exception as e:
+            print(f"❌ Error fetching activity type: {e}")
+            return False
 
-def create_campaign(url, session_id, campaign_name):
-    """Create a new campaign in Odoo"""
-    headers = {
-        "Content-Type": "application/json",
-        "Cookie": f"session_id={session_id}"
-    }
+        activities = [build_activity_data(activity_type, lead_id, user_id) for lead_id in lead_ids]
+        get_xmlrpc_models().execute_kw(db, uid, password, 'mail.activity', 'create', [activities])
+        print(f"✅ Created {len(activities)} activities for leads {lead_ids}")
+        return True
 
-    create_data = {
-        "jsonrpc": "2.0",
-        "method": "call",
-        "params": {
-            "model": "utm.campaign",
-            "method": "create",
-            "args": [{
-                "name": campaign_name
-            }],
-            "kwargs": {}
-        }
-    }
+    except Exception as e:
+        print(f"❌ Error creating activities for leads {lead_ids}: {e}")
+        return False
 
-    response = requests.post(url + "/web/dataset/call_kw/utm.campaign/create", 
-                             data=json.dumps(create_data), headers=headers)
-    
-    if response.status_code == 200 and response.json().get("result"):
-        new_campaign_id = response.json()["result"]
-        print(f"✅ Created new campaign '{campaign_name}' (ID: {new_campaign_id})")
-        return new_campaign_id
-    else:
-        print(f"❌ Failed to create campaign. Status Code: {response.status_code}")
+def open_processing_queue(gc):
+    """Open the processing queue worksheet once for the whole run"""
+    try:
+        return open_worksheet(gc, SPREADSHEET_ID, PROCESSING_QUEUE_NAME)
+    except Exception as e:
+        print(f"No processing queue found: {e}")
         return None
 
-def check_processing_queue(gc):
+def check_processing_queue(processing_sheet):
     """Check for pending leads in processing queue"""
     try:
-        sheet = gc.open_by_key(SPREADSHEET_ID)
-        
-        try:
-            processing_sheet = sheet.worksheet(PROCESSING_QUEUE_NAME)
-        except:
-            print("No processing queue found")
-            return []
-        
         all_values = processing_sheet.get_all_values()
         if len(all_values) <= 1:
             print("No pending leads in processing queue")
@@ -269,127 +255,180 @@ def check_processing_queue(gc):
         print(f"Error checking processing queue: {e}")
         return []
 
-def mark_lead_processed(gc, row_number, status='PROCESSED'):
-    """Mark a lead as processed in the queue"""
-    try:
-        sheet = gc.open_by_key(SPREADSHEET_ID)
-        processing_sheet = sheet.worksheet(PROCESSING_QUEUE_NAME)
-        processing_sheet.update_cell(row_number, 4, status)
-        processing_sheet.update_cell(row_number, 1, datetime.now().isoformat())
-    except Exception as e:
-        print(f"Error marking lead as processed: {e}")
+class QueueStatusWriter:
+    """Collect the status changes of a run and write them to the queue with one batch_update"""
+
+    def __init__(self, processing_sheet):
+        self.processing_sheet = processing_sheet
+        self._updates = {}  # queue row -> (status, timestamp)
+
+    def mark(self, row_number, status='PROCESSED'):
+        """Mark a lead as processed in the queue (written on flush)"""
+        self._updates[row_number] = (status, datetime.now().isoformat())
+
+    def flush(self):
+        if not self._updates:
+            return
+        data = []
+        for row_number, (status, timestamp) in sorted(self._updates.items()):
+            data.append({'range': f'A{row_number}', 'values': [[timestamp]]})
+            data.append({'range': f'D{row_number}', 'values': [[status]]})
+        try:
+            self.processing_sheet.batch_update(data, value_input_option='USER_ENTERED')
+            print(f"Updated the status of {len(self._updates)} queue row(s)")
+        except Exception as e:
+            print(f"Error marking leads as processed: {e}")
+        self._updates = {}
+
+def form_row_to_lead(headers, row):
+    """Map a Form responses row to the lead fields we import, including the UTM fields"""
+    form_data = {}
+    for i, header in enumerate(headers):
+        form_data[header] = row[i] if i < len(row) else ''
+
+    return {
+        'submission_date': form_data.get('Submission Date', ''),
+        'first_name': form_data.get('Name - First Name', ''),
+        'last_name': form_data.get('Name - Last Name', ''),
+        'phone': form_data.get('Phone Number', ''),
+        'email': form_data.get('Email Address', ''),
+        'company': form_data.get('Your Company', ''),
+        'industry': form_data.get('Industry', ''),
+        'whiteboard_type': form_data.get('Whiteboard Type', ''),
+        'size': form_data.get('Approximate Size', ''),
+        'quantity': form_data.get('Quantity', ''),
+        'description': form_data.get('Description', ''),
+        'submission_id': form_data.get('Submission ID', ''),
+        # UTM Campaign Data
+        'campaign_source': form_data.get('campaign_source', ''),
+        'campaign_medium': form_data.get('campaign_medium', ''),
+        'campaign_campaign': form_data.get('campaign_campaign', ''),
+        'campaign_term': form_data.get('campaign_term', ''),
+        'campaign_content': form_data.get('campaign_content', ''),
+        'campaign_landing_page': form_data.get('campaign_landing_page', ''),
+        'campaign_referrer_url': form_data.get('campaign_referrer_url', ''),
+        'campaign_gclid': form_data.get('campaign_gclid', ''),
+        'campaign_matchtype': form_data.get('campaign_matchtype', ''),
+        'campaign_network': form_data.get('campaign_network', ''),
+        'campaign_device': form_data.get('campaign_device', ''),
+        'campaign_session_timestamp': form_data.get('campaign_session_timestamp', '')
+    }
+
+class FormResponses:
+    """Index of the Form responses sheet by email and full name, built from one fetch.
+
+    Each key points at its LATEST row. With `tail_rows` the header and the
+    email column are read first to find the last filled row (the grid's
+    row count includes empty spare rows), then only the newest rows are
+    fetched; a lookup that misses them re-reads the whole sheet once.
+    """
+
+    def __init__(self, worksheet, tail_rows=FORM_RESPONSES_TAIL_ROWS):
+        self.worksheet = worksheet
+        self.partial = False
+
+        if tail_rows:
+            # Ranged reads stop at the last filled cell, so this is the data extent
+            header, emails = worksheet.batch_get(['1:1', 'E:E'])
+            last_row = len(emails)
+            self.partial = last_row - 1 > tail_rows
+
+        if self.partial:
+            start = last_row - tail_rows + 1
+            # Open-ended, so rows added after the email column was read are still included
+            last_column = re.sub(r'\d', '', rowcol_to_a1(1, worksheet.col_count))
+            tail = worksheet.get(f'A{start}:{last_column}')
+            self._build(list(header[:1]) + list(tail))
+        else:
+            self._build(worksheet.get_all_values())
+
+    def _build(self, all_values):
+        self.headers = all_values[0] if all_values else []
+        self._by_email = {}
+        self._by_name = {}
+
+        for position, row in enumerate(all_values[1:]):
+            # Ranged reads drop trailing empty cells
+            row = row + [''] * (len(self.headers) - len(row))
+            row_email = row[4] if len(row) > 4 else ''
+            if not row_email:
+                continue
+            row_first_name = row[1] if len(row) > 1 else ''
+            row_last_name = row[2] if len(row) > 2 else ''
+            full_name = f"{row_first_name} {row_last_name}".strip()
+
+            # Later rows overwrite earlier ones, so every key ends on its latest row
+            self._by_email[row_email] = (position, row)
+            self._by_name[full_name] = (position, row)
+
+        print(f"Indexed {len(all_values[1:])} form responses{' (newest rows only)' if self.partial else ''}")
+
+    def _lookup(self, lead_name, lead_email):
+        matches = [match for match in (self._by_email.get(lead_email), self._by_name.get(lead_name)) if match]
+        if not matches:
+            return None
+        return form_row_to_lead(self.headers, max(matches, key=lambda match: match[0])[1])
+
+    def find(self, lead_name, lead_email):
+        """Return the lead data of the LATEST row matching the name or email, or None"""
+        matching_lead = self._lookup(lead_name, lead_email)
+        if matching_lead is None and self.partial:
+            print(f"{lead_name} ({lead_email}) is not in the newest rows, reading all form responses")
+            self.partial = False
+            self._build(self.worksheet.get_all_values())
+            matching_lead = self._lookup(lead_name, lead_email)
 
-def get_lead_from_form_responses(gc, lead_name, lead_email):
-    """Find full lead data from form responses - get the LATEST matching row"""
-    try:
-        sheet = gc.open_by_key(SPREADSHEET_ID)
-        worksheet = sheet.worksheet(WORKSHEET_NAME)
-        
-        all_values = worksheet.get_all_values()
-        headers = all_values[0]
-        
-        matching_lead = None
-        
-        # Search from bottom up to get latest
-        for row in reversed(all_values[1:]):
-            if len(row) >= len(headers):
-                row_first_name = row[1] if len(row) > 1 else ''
-                row_last_name = row[2] if len(row) > 2 else ''
-                row_email = row[4] if len(row) > 4 else ''
-                
-                full_name = f"{row_first_name} {row_last_name}".strip()
-                
-                print(f"Checking row: {full_name} ({row_email}) vs looking for: {lead_name} ({lead_email})")
-                
-                if (full_name == lead_name or row_email == lead_email) and row_email:
-                    print(f"✅ Found matching lead: {full_name} with email {row_email}")
-                    
-                    # Map ALL the form data including UTM fields
-                    form_data = {}
-                    for i, header in enumerate(headers):
-                        form_data[header] = row[i] if i < len(row) else ''
-                    
-                    matching_lead = {
-                        'submission_date': form_data.get('Submission Date', ''),
-                        'first_name': form_data.get('Name - First Name', ''),
-                        'last_name': form_data.get('Name - Last Name', ''),
-                        'phone': form_data.get('Phone Number', ''),
-                        'email': form_data.get('Email Address', ''),
-                        'company': form_data.get('Your Company', ''),
-                        'industry': form_data.get('Industry', ''),
-                        'whiteboard_type': form_data.get('Whiteboard Type', ''),
-                        'size': form_data.get('Approximate Size', ''),
-                        'quantity': form_data.get('Quantity', ''),
-                        'description': form_data.get('Description', ''),
-                        'submission_id': form_data.get('Submission ID', ''),
-                        # UTM Campaign Data
-                        'campaign_source': form_data.get('campaign_source', ''),
-                        'campaign_medium': form_data.get('campaign_medium', ''),
-                        'campaign_campaign': form_data.get('campaign_campaign', ''),
-                        'campaign_term': form_data.get('campaign_term', ''),
-                        'campaign_content': form_data.get('campaign_content', ''),
-                        'campaign_landing_page': form_data.get('campaign_landing_page', ''),
-                        'campaign_referrer_url': form_data.get('campaign_referrer_url', ''),
-                        'campaign_gclid': form_data.get('campaign_gclid', ''),
-                        'campaign_matchtype': form_data.get('campaign_matchtype', ''),
-                        'campaign_network': form_data.get('campaign_network', ''),
-                        'campaign_device': form_data.get('campaign_device', ''),
-                        'campaign_session_timestamp': form_data.get('campaign_session_timestamp', '')
-                    }
-                    break
-        
         if matching_lead:
-            print(f"Returning lead data for: {matching_lead['first_name']} {matching_lead['last_name']}")
+            print(f"✅ Found matching lead: {matching_lead['first_name']} {matching_lead['last_name']} with email {matching_lead['email']}")
             print(f"UTM Source: {matching_lead['campaign_source']}")
             print(f"UTM Medium: {matching_lead['campaign_medium']}")
             print(f"UTM Campaign: {matching_lead['campaign_campaign']}")
         else:
             print(f"No matching lead found for: {lead_name} ({lead_email})")
-            
+
         return matching_lead
+
+def get_lead_from_form_responses(gc, lead_name, lead_email):
+    """Find full lead data from form responses - get the LATEST matching row"""
+    try:
+        worksheet = open_worksheet(gc, SPREADSHEET_ID, WORKSHEET_NAME)
+        return FormResponses(worksheet).find(lead_name, lead_email)
         
     except Exception as e:
         print(f"Error getting lead from form responses: {e}")
         return None
 
-def create_lead_in_odoo(url, session_id, lead_data):
-    """Create lead in Odoo with campaign/source/medium data"""
-    headers = {
-        "Content-Type": "application/json",
-        "Cookie": f"session_id={session_id}"
-    }
+def get_leads_from_form_responses(gc, pending_leads):
+    """Find the form data of every pending lead from one read of Form responses.
 
-    # Check if lead already exists by email
-    if lead_data['email']:
-        search_data = {
-            "jsonrpc": "2.0",
-            "method": "call",
-            "params": {
-                "model": "crm.lead",
-                "method": "search_read",
-                "args": [[["email_from", "=", lead_data['email']]]],
-                "kwargs": {
-                    "fields": ["id", "name"],
-                    "limit": 1
-                }
-            }
-        }
-
-        response = requests.post(url + "/web/dataset/call_kw/crm.lead/search_read", 
-                                 data=json.dumps(search_data), headers=headers)
-        
-        if response.status_code == 200:
-            results = response.json().get("result", [])
-            if results:
-                print(f"Lead already exists: {results[0]['name']} (ID: {results[0]['id']})")
-                return results[0]['id']
+    Returns {queue row: lead data} for the leads that were found.
+    """
+    try:
+        worksheet = open_worksheet(gc, SPREADSHEET_ID, WORKSHEET_NAME)
+        form_responses = FormResponses(worksheet)
 
-    # Get campaign ID from campaign name
+        leads = {}
+        for pending in pending_leads:
+            lead_data = form_responses.find(pending['name'], pending['email'])
+            if lead_data:
+                leads[pending['row']] = lead_data
+        return leads
+
+    except Exception as e:
+        print(f"Error getting leads from form responses: {e}")
+        return {}
+
+def get_campaign_name(lead_data):
+    """Return the UTM campaign name of a form submission"""
     campaign_name = lead_data.get('campaign_campaign', 'Website Form Submission')
     if not campaign_name:
         campaign_name = 'Website Form Submission'
-    campaign_id = get_or_create_campaign_id(url, session_id, campaign_name)
-    
+    return campaign_name
+
+def build_odoo_lead_data(lead_data, campaign_id):
+    """Build the crm.lead values for a form submission"""
+    campaign_name = get_campaign_name(lead_data)
+
     # Get source and medium IDs
     source_name = lead_data.get('campaign_source', '').lower().strip()
     medium_name = lead_data.get('campaign_medium', '').lower().strip()
@@ -457,58 +496,184 @@ Device: {lead_data.get('campaign_device', 'Not specified')}"""
     print(f"   Medium ID: {medium_id}")
     print(f"   Website: {lead_data.get('campaign_landing_page', 'Not set')}")
 
-    create_data = {
-        "jsonrpc": "2.0",
-        "method": "call",
-        "params": {
-            "model": "crm.lead",
-            "method": "create",
-            "args": [odoo_lead_data],
-            "kwargs": {}
-        }
-    }
+    return odoo_lead_data
 
-    response = requests.post(url + "/web/dataset/call_kw/crm.lead/create", 
-                             data=json.dumps(create_data), headers=headers)
+def create_lead_in_odoo(odoo, campaigns, lead_data, mirror=None):
+    """Create lead in Odoo with campaign/source/medium data"""
+    # Check if lead already exists by email, locally when the CRM mirror is current
+    if lead_data['email'] and mirror is not None:
+        existing = find_lead_by_email(mirror, lead_data['email'])
+        if existing:
+            print(f"Lead already exists: {existing['name']} (ID: {existing['id']})")
+            return existing['id']
+    elif lead_data['email']:
+        try:
+            results = odoo.search_read("crm.lead", [["email_from", "=", lead_data['email']]], ["id", "name"], limit=1)
+        except OdooError as e:
+            print(f"❌ Failed to search existing leads. {e}")
+            results = []
 
-    if response.status_code == 200 and response.json().get("result"):
-        lead_id = response.json()["result"]
-        print(f"✅ Created lead '{lead_name}' with ID: {lead_id} assigned to Michael Betancourt")
-        
-        # Create activity for the lead
-        print(f"📅 Creating activity for lead {lead_id}...")
-        activity_created = create_activity_for_lead(lead_id, MICHAEL_BETANCOURT_USER_ID)
-        if activity_created:
-            print(f"✅ Activity created successfully for lead {lead_id}")
-        else:
-            print(f"❌ Failed to create activity for lead {lead_id}")
-        
-        return lead_id
-    else:
-        print(f"❌ Failed to create lead. Response: {response.json()}")
+        if results:
+            print(f"Lead already exists: {results[0]['name']} (ID: {results[0]['id']})")
+            return results[0]['id']
+
+    # Get campaign ID from campaign name
+    campaign_id = campaigns.get(get_campaign_name(lead_data))
+    odoo_lead_data = build_odoo_lead_data(lead_data, campaign_id)
+    lead_name = odoo_lead_data['name']
+
+    try:
+        lead_id = odoo.create("crm.lead", odoo_lead_data)
+    except OdooError as e:
+        print(f"❌ Failed to create lead. {e}")
         return None
 
-def main():
-    print("🚀 Checking for new leads from processing queue...")
+    print(f"✅ Created lead '{lead_name}' with ID: {lead_id} assigned to Michael Betancourt")
+
+    # Record the new lead locally so a repeat submission is deduped before the next sync
+    if mirror is not None:
+        upsert_leads(mirror, [dict(odoo_lead_data, id=lead_id)])
     
-    # Authenticate with Google Sheets
-    gc = authenticate_google_sheets()
-    if not gc:
-        return
+    # Create activity for the lead
+    print(f"📅 Creating activity for lead {lead_id}...")
+    activity_created = create_activity_for_lead(lead_id, MICHAEL_BETANCOURT_USER_ID)
+    if activity_created:
+        print(f"✅ Activity created successfully for lead {lead_id}")
+    else:
+        print(f"❌ Failed to create activity for lead {lead_id}")
     
+    return lead_id
+
+def create_leads_in_odoo(odoo, campaigns, leads, mirror=None):
+    """Create the leads of several queue rows at once.
+
+    `leads` maps queue row -> form data. Emails already in the CRM (checked
+    against the mirror, or with one `email_from in [...]` search when it is
+    not current) and repeats within the batch are not created again; the
+    newest queue row wins. New leads are created with one multi-record
+    create and their activities with another. If Odoo rejects the batch,
+    the leads are created one by one so only the bad rows fail.
+
+    Returns {queue row: lead id, or None if the lead could not be created}.
+    """
+    emails = list(dict.fromkeys(lead_data['email'] for lead_data in leads.values() if lead_data['email']))
+    existing = {}
+    if mirror is not None:
+        for email in emails:
+            lead = find_lead_by_email(mirror, email)
+            if lead:
+                existing[normalize_email(email)] = lead
+    elif emails:
+        try:
+            found = odoo.search_read("crm.lead", [["email_from", "in", emails]], ["id", "name", "email_from"])
+        except OdooError as e:
+            print(f"❌ Failed to search existing leads. {e}")
+            found = []
+        for lead in found:
+            existing.setdefault(normalize_email(lead['email_from']), lead)
+
+    results = {}
+    duplicates = {}  # queue row -> queue row creating the same email
+    creating = {}  # email -> queue row creating it
+    to_create = []
+    for row in sorted(leads, reverse=True):
+        email = normalize_email(leads[row]['email'])
+        if email in existing:
+            print(f"Lead already exists: {existing[email]['name']} (ID: {existing[email]['id']})")
+            results[row] = existing[email]['id']
+        elif email in creating:
+            print(f"Queue row {row} repeats {email}, already imported from row {creating[email]}")
+            duplicates[row] = creating[email]
+        else:
+            if email:
+                creating[email] = row
+            to_create.append(row)
+
+    if to_create:
+        campaign_ids = campaigns.resolve([get_campaign_name(leads[row]) for row in to_create])
+        values = [
+            build_odoo_lead_data(leads[row], campaign_ids.get(get_campaign_name(leads[row]).strip()))
+            for row in to_create
+        ]
+
+        try:
+            lead_ids = odoo.create("crm.lead", values)
+        except OdooError as e:
+            # One bad submission rejects the whole batch; create one at a time so only it fails
+            print(f"❌ Failed to create {len(values)} lead(s) at once, creating them one by one. {e}")
+            lead_ids = []
+            for row, lead_values in zip(to_create, values):
+                try:
+                    lead_ids.append(odoo.create("crm.lead", lead_values))
+                except OdooError as e:
+                    print(f"❌ Failed to create lead from queue row {row}. {e}")
+                    lead_ids.append(None)
+
+        for row, lead_id in zip(to_create, lead_ids):
+            results[row] = lead_id
+
+        created = [dict(lead_values, id=lead_id) for lead_values, lead_id in zip(values, lead_ids) if lead_id]
+        if created:
+            print(f"✅ Created {len(created)} lead(s) with IDs {[lead['id'] for lead in created]} assigned to Michael Betancourt")
+
+            # Record the new leads locally so a repeat submission is deduped before the next sync
+            if mirror is not None:
+                upsert_leads(mirror, created)
+
+            print(f"📅 Creating activities for {len(created)} lead(s)...")
+            create_activities_for_leads([lead['id'] for lead in created], MICHAEL_BETANCOURT_USER_ID)
+
+    for row, original_row in duplicates.items():
+        results[row] = results.get(original_row)
+    return results
+
+def process_pending_leads_batch(gc, odoo, mirror, pending_leads, statuses):
+    """Import every pending queue row in one pass"""
+    leads = get_leads_from_form_responses(gc, pending_leads)
+
+    for pending in pending_leads:
+        if pending['row'] not in leads:
+            print(f"❌ Could not find full data for {pending['name']}")
+            statuses.mark(pending['row'], 'ERROR')
+
+    lead_ids = create_leads_in_odoo(odoo, CampaignResolver(odoo), leads, mirror)
+
+    processed = 0
+    for row, lead_id in sorted(lead_ids.items()):
+        if lead_id:
+            statuses.mark(row, 'PROCESSED')
+            processed += 1
+        else:
+            statuses.mark(row, 'FAILED')
+
+    print(f"✅ Processed {processed} of {len(pending_leads)} pending leads")
+
+def process_queue(gc, processing_sheet, statuses, odoo=None, batch=LEAD_IMPORT_BATCH):
+    """Import the pending leads of the processing queue"""
     # Check processing queue
-    pending_leads = check_processing_queue(gc)
+    pending_leads = check_processing_queue(processing_sheet)
     if not pending_leads:
         print("No new leads to process")
         return
     
+    # Authenticate with Odoo (the worker passes in its warm client)
+    if odoo is None:
+        odoo = authenticate_odoo(odoo_url, db, login, password)
+
+    # Dedupe against the local crm.lead mirror; fall back to asking Odoo if it can't be synced
+    mirror = open_mirror()
+    if not sync_mirror(mirror, odoo):
+        mirror = None
+
+    if batch:
+        print(f"Processing all {len(pending_leads)} pending leads")
+        process_pending_leads_batch(gc, odoo, mirror, pending_leads, statuses)
+        return
+
     # Process only the LAST pending lead in the queue
     latest_lead = max(pending_leads, key=lambda x: x['row'])
     print(f"Processing latest lead: {latest_lead['name']} (row: {latest_lead['row']})")
     
-    # Authenticate with Odoo
-    session_id = authenticate_odoo(odoo_url, db, login, password)
-    
     print(f"\n--- Processing: {latest_lead['name']} ---")
     
     # Get full lead data from form responses
@@ -516,18 +681,122 @@ def main():
     
     if not lead_data:
         print(f"❌ Could not find full data for {latest_lead['name']}")
-        mark_lead_processed(gc, latest_lead['row'], 'ERROR')
+        statuses.mark(latest_lead['row'], 'ERROR')
         return
     
     # Create lead in Odoo with campaign data
-    lead_id = create_lead_in_odoo(odoo_url, session_id, lead_data)
+    lead_id = create_lead_in_odoo(odoo, CampaignResolver(odoo), lead_data, mirror)
     
     if lead_id:
-        mark_lead_processed(gc, latest_lead['row'], 'PROCESSED')
+        statuses.mark(latest_lead['row'], 'PROCESSED')
         print(f"✅ Successfully processed latest lead: {latest_lead['name']} with campaign data and activity")
     else:
-        mark_lead_processed(gc, latest_lead['row'], 'FAILED')
+        statuses.mark(latest_lead['row'], 'FAILED')
         print(f"❌ Failed to process latest lead: {latest_lead['name']}")
 
+def main():
+    print("🚀 Checking for new leads from processing queue...")
+    
+    # Authenticate with Google Sheets
+    gc = authenticate_google_sheets()
+    if not gc:
+        return
+    
+    processing_sheet = open_processing_queue(gc)
+    if not processing_sheet:
+        return
+
+    # Status changes are collected and written in one request at the end
+    statuses = QueueStatusWriter(processing_sheet)
+    try:
+        process_queue(gc, processing_sheet, statuses)
+    finally:
+        statuses.flush()
+
+def get_queue_row_count(processing_sheet):
+    """Return the number of filled rows of the processing queue, read from column A only.
+
+    The grid's rowCount doesn't move when a row is appended into spare
+    grid rows; a ranged read stops at the last filled cell, so it does.
+    """
+    return len(processing_sheet.col_values(1))
+
+def start_trigger_server(trigger, port=LEAD_IMPORT_HTTP_PORT, token=LEAD_IMPORT_TRIGGER_TOKEN):
+    """Serve a local endpoint; any POST to it (e.g. from the form webhook) sets `trigger`.
+
+    Without a token the endpoint only listens on 127.0.0.1.
+    """
+    class TriggerHandler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get('Content-Length') or 0))
+            if token and not hmac.compare_digest(self.headers.get('Authorization', ''), f'Bearer {token}'):
+                self.send_response(401)
+                self.end_headers()
+                return
+            trigger.set()
+            self.send_response(202)
+            self.end_headers()
+            self.wfile.write(b'Import queued\n')
+
+        def log_message(self, format, *args):
+            print(f"🔔 Trigger request from {self.client_address[0]}: {format % args}")
+
+    host = '' if token else '127.0.0.1'
+    server = ThreadingHTTPServer((host, port), TriggerHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    print(f"👂 Listening for import triggers on {host or 'all interfaces'}, port {port}")
+    return server
+
+def run_worker():
+    """Keep the Sheets and Odoo clients warm and import pending leads as soon as they show up.
+
+    Imports run when the trigger endpoint is called, when the queue's row
+    count changes, and every LEAD_IMPORT_FULL_CHECK_SECONDS as a safety net.
+    Every import drains all pending rows.
+    """
+    print("🚀 Starting lead import worker...")
+
+    gc = authenticate_google_sheets()
+    if not gc:
+        return
+    processing_sheet = open_processing_queue(gc)
+    if not processing_sheet:
+        return
+    odoo = authenticate_odoo(odoo_url, db, login, password)
+
+    trigger = threading.Event()
+    if LEAD_IMPORT_HTTP_PORT:
+        start_trigger_server(trigger)
+
+    last_row_count = None
+    last_import = 0
+    trigger.set()  # Import whatever is already pending on startup
+
+    while True:
+        triggered = trigger.wait(LEAD_IMPORT_POLL_SECONDS)
+        trigger.clear()
+
+        try:
+            row_count = get_queue_row_count(processing_sheet)
+        except Exception as e:
+            print(f"Error checking processing queue size: {e}")
+            row_count = last_row_count
+
+        if not triggered and row_count == last_row_count and time.time() - last_import < LEAD_IMPORT_FULL_CHECK_SECONDS:
+            continue
+        last_row_count = row_count
+
+        last_import = time.time()
+        statuses = QueueStatusWriter(processing_sheet)
+        try:
+            process_queue(gc, processing_sheet, statuses, odoo, batch=True)
+        except Exception as e:
+            print(f"❌ Error importing leads: {e}")
+        finally:
+            statuses.flush()
+
 if __name__ == '__main__':
-    main()
+    if LEAD_IMPORT_WORKER:
+        run_worker()
+    else:
+        main()
@@ -0,0 +1,347 @@
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# Size of the keep-alive connection pool shared by every call a script makes
+ODOO_POOL_SIZE = int(os.environ.get('ODOO_POOL_SIZE', '4'))
+# Seconds to wait for Odoo before giving up on a request
+ODOO_TIMEOUT = float(os.environ.get('ODOO_TIMEOUT', '120'))
+# Most record ids sent in one coalesced write before it is flushed early
+ODOO_WRITE_BATCH_SIZE = int(os.environ.get('ODOO_WRITE_BATCH_SIZE', '100'))
+# Concurrent Odoo requests when flushing writes (1 keeps everything sequential)
+ODOO_WORKERS = int(os.environ.get('ODOO_WORKERS', '1'))
+# Session cookies kept between runs so a still valid session skips the login (empty turns
+# this off). The workflows only cache .state encrypted with STATE_ENCRYPTION_KEY
+ODOO_SESSION_PATH = os.environ.get('ODOO_SESSION_PATH', '.state/odoo_sessions.json')
+# Hours a stored session is reused at most, even if its cookie lives longer
+ODOO_SESSION_TTL_HOURS = float(os.environ.get('ODOO_SESSION_TTL_HOURS', '168'))
+
+
+class OdooError(Exception):
+    """Raised when Odoo rejects or fails a JSON-RPC call"""
+
+
+class OdooSessionExpired(OdooError):
+    """Raised when Odoo no longer accepts the session cookie"""
+
+
+def _load_sessions(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {}
+
+
+def _save_sessions(path, sessions):
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp_path = path + '.tmp'
+    # The file holds live session cookies, so keep it private to this user
+    with open(os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), 'w') as f:
+        json.dump(sessions, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+class OdooClient:
+    """Odoo JSON-RPC client that reuses warm connections from one pooled session.
+
+    `authenticate()` stores the session cookie on the underlying
+    `requests.Session`, so every later call is sent on an already open
+    TLS connection without rebuilding headers or cookies. The cookie is
+    also saved to `session_path`, and the next run reuses it after one
+    cheap `get_session_info` check instead of logging in again.
+    """
+
+    def __init__(self, url, db, login, password, pool_size=max(ODOO_POOL_SIZE, ODOO_WORKERS), timeout=ODOO_TIMEOUT,
+                 session_path=ODOO_SESSION_PATH):
+        self.url = url.rstrip('/')
+        self.db = db
+        self.login = login
+        self.password = password
+        self.timeout = timeout
+        self.session_path = session_path
+        self.uid = None
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.session.headers.update({"Content-Type": "application/json"})
+
+    @property
+    def session_id(self):
+        return self.session.cookies.get('session_id')
+
+    def _post(self, path, params):
+        payload = {
+            "jsonrpc": "2.0",
+            "method": "call",
+            "params": params
+        }
+        # Timeouts, dropped connections and non-JSON bodies (e.g. a proxy error page) are
+        # OdooErrors too, so callers only ever have to catch one exception type
+        try:
+            response = self.session.post(self.url + path, data=json.dumps(payload), timeout=self.timeout)
+        except requests.RequestException as e:
+            raise OdooError(f"Request to {path} failed: {e}")
+
+        if response.status_code != 200:
+            raise OdooError(f"Status Code: {response.status_code}, Response: {response.text[:500]}")
+
+        try:
+            body = response.json()
+        except ValueError:
+            raise OdooError(f"Invalid JSON response from {path}: {response.text[:500]}")
+        if "error" in body:
+            error = body["error"]
+            message = error.get("data", {}).get("message") or error.get("message")
+            if error.get("code") == 100 or "SessionExpired" in error.get("data", {}).get("name", ""):
+                raise OdooSessionExpired(f"{message}")
+            raise OdooError(f"{message}")
+        return body.get("result")
+
+    @property
+    def _session_key(self):
+        return f"{self.url}|{self.db}|{self.login}"
+
+    def _resume_session(self):
+        """Load the stored session cookie and keep it if Odoo still accepts it"""
+        sessions = _load_sessions(self.session_path)
+        stored = sessions.get(self._session_key)
+        if not stored:
+            return False
+
+        if stored["expires"] > time.time():
+            self.session.cookies.set("session_id", stored["session_id"], domain=urlsplit(self.url).hostname)
+            try:
+                info = self._post("/web/session/get_session_info", {})
+            except OdooError as e:
+                print(f"Stored Odoo session could not be checked. {e}")
+                info = None
+            if info and info.get("uid") == stored["uid"] and info.get("db") == self.db:
+                self.uid = stored["uid"]
+                return True
+            self.session.cookies.clear()
+
+        del sessions[self._session_key]
+        _save_sessions(self.session_path, sessions)
+        return False
+
+    def _store_session(self):
+        expires = time.time() + ODOO_SESSION_TTL_HOURS * 3600
+        for cookie in self.session.cookies:
+            if cookie.name == "session_id" and cookie.expires:
+                expires = min(expires, cookie.expires)
+
+        sessions = _load_sessions(self.session_path)
+        sessions[self._session_key] = {"session_id": self.session_id, "uid": self.uid, "expires": expires}
+        _save_sessions(self.session_path, sessions)
+
+    def authenticate(self):
+        """Reuse the stored session if it is still valid, otherwise log in and store the new one"""
+        if self.session_path and self._resume_session():
+            return self.session_id
+        return self._login()
+
+    def _login(self):
+        result = self._post("/web/session/authenticate", {
+            "db": self.db,
+            "login": self.login,
+            "password": self.password
+        })
+        if not result or not result.get("uid"):
+            raise OdooError("Authentication failed")
+        self.uid = result["uid"]
+        if self.session_path:
+            self._store_session()
+        return self.session_id
+
+    def call_kw(self, model, method, args=None, kwargs=None):
+        """Call `method` on `model` through /web/dataset/call_kw.
+
+        If the session expired (a long-running worker outlives it), log in
+        again and retry the call once.
+        """
+        path = f"/web/dataset/call_kw/{model}/{method}"
+        params = {
+            "model": model,
+            "method": method,
+            "args": args or [],
+            "kwargs": kwargs or {}
+        }
+        try:
+            return self._post(path, params)
+        except OdooSessionExpired as e:
+            print(f"Odoo session expired, logging in again. {e}")
+            self.session.cookies.clear()
+            self._login()
+            return self._post(path, params)
+
+    def search(self, model, domain, **kwargs):
+        return self.call_kw(model, "search", [domain], kwargs)
+
+    def search_read(self, model, domain, fields=None, **kwargs):
+        if fields is not None:
+            kwargs["fields"] = fields
+        return self.call_kw(model, "search_read", [domain], kwargs)
+
+    def read(self, model, ids, fields=None):
+        kwargs = {"fields": fields} if fields is not None else {}
+        return self.call_kw(model, "read", [list(ids)], kwargs)
+
+    def write(self, model, ids, values):
+        return self.call_kw(model, "write", [list(ids), values])
+
+    def create(self, model, values):
+        """Create one record (dict) or several at once (list of dicts)"""
+        return self.call_kw(model, "create", [values])
+
+
+def _comparable(value):
+    """Reduce a field value to what a write would compare: many2one [id, name] -> id, empty -> None"""
+    if isinstance(value, list):
+        return value[0] if value else None
+    if value is False or value == "":
+        return None
+    return value
+
+
+class WriteBatcher:
+    """Coalesce pending writes so records receiving the same values share one `write`.
+
+    Writes are grouped by (model, values). A group is sent as soon as it
+    holds `batch_size` ids, and everything left is sent by `flush()` at the
+    end of the run, `workers` groups at a time. Queueing a record again replaces its earlier pending
+    values, so the last write for a record wins as it would if each write
+    had been sent immediately.
+    """
+
+    def __init__(self, odoo, batch_size=ODOO_WRITE_BATCH_SIZE, workers=ODOO_WORKERS):
+        self.odoo = odoo
+        self.batch_size = batch_size
+        self.workers = workers
+        self.applied = 0
+        self.skipped = 0
+        self.failed = 0
+        self.requests = 0
+        self.failed_ids = set()  # (model, record id) of every record whose write failed
+        self._groups = {}  # (model, values key) -> {"model", "values", "ids"}
+        self._pending = {}  # (model, record id) -> (model, values key)
+
+    def queue(self, model, ids, values):
+        if not ids:
+            return
+        key = (model, json.dumps(values, sort_keys=True))
+        group = self._groups.setdefault(key, {"model": model, "values": dict(values), "ids": {}})
+
+        for record_id in ids:
+            if self._pending.get((model, record_id), key) != key:
+                self._unqueue(model, record_id)
+            self._pending[(model, record_id)] = key
+            group["ids"][record_id] = True
+
+        if len(group["ids"]) >= self.batch_size:
+            self._send(key)
+
+    def queue_changes(self, model, record, values):
+        """Queue only the fields of `values` that differ from `record`'s current values.
+
+        `record` is the record as last read from Odoo (or the local mirror).
+        A write that would change nothing is skipped and counted in `skipped`.
+        """
+        record_id = record["id"]
+        key = self._pending.get((model, record_id))
+        if key is not None:
+            values = dict(self._groups[key]["values"], **values)
+
+        changes = {
+            field: value for field, value in values.items()
+            if _comparable(record.get(field)) != _comparable(value)
+        }
+        if changes:
+            self.queue(model, [record_id], changes)
+            return
+
+        if key is not None:
+            self._unqueue(model, record_id)
+        self.skipped += 1
+
+    def _unqueue(self, model, record_id):
+        key = self._pending.pop((model, record_id))
+        group = self._groups[key]
+        del group["ids"][record_id]
+        if not group["ids"]:
+            del self._groups[key]
+
+    def _detach(self, key):
+        group = self._groups.pop(key)
+        model = group["model"]
+        ids = list(group["ids"])
+        for record_id in ids:
+            self._pending.pop((model, record_id), None)
+        return model, ids, group["values"]
+
+    def _write(self, model, ids, values):
+        try:
+            self.odoo.write(model, ids, values)
+        except OdooError as e:
+            return f"Failed to update {len(ids)} record(s) in {model} {ids}. {e}"
+        return None
+
+    def _write_concurrently(self, batches):
+        # Imported here: async_clients builds on this module
+        from async_clients import aiohttp, call_kw_many
+
+        if aiohttp is None:
+            with ThreadPoolExecutor(max_workers=self.workers) as pool:
+                return list(pool.map(lambda batch: self._write(*batch), batches))
+
+        results = call_kw_many(
+            self.odoo,
+            [(model, "write", [ids, values], {}) for model, ids, values in batches],
+            self.workers
+        )
+        return [
+            f"Failed to update {len(ids)} record(s) in {model} {ids}. {result}"
+            if isinstance(result, Exception) else None
+            for (model, ids, _), result in zip(batches, results)
+        ]
+
+    def _record(self, model, ids, error):
+        self.requests += 1
+        if error:
+            print(error)
+            self.failed += len(ids)
+            self.failed_ids.update((model, record_id) for record_id in ids)
+        else:
+            print(f"Record IDs {ids} in {model} successfully updated.")
+            self.applied += len(ids)
+
+    def _send(self, key):
+        model, ids, values = self._detach(key)
+        self._record(model, ids, self._write(model, ids, values))
+
+    def flush(self):
+        """Send every pending write group.
+
+        With more than one worker the groups are written concurrently on
+        the shared session (asyncio when aiohttp is installed, a thread
+        pool otherwise); each record is in exactly one pending group, so
+        the order between groups doesn't matter. Results are reported in
+        queue order once all writes have returned.
+        """
+        batches = [self._detach(key) for key in list(self._groups)]
+        if self.workers > 1 and len(batches) > 1:
+            errors = self._write_concurrently(batches)
+        else:
+            errors = [self._write(*batch) for batch in batches]
+
+        for (model, ids, _), error in zip(batches, errors):
+            self._record(model, ids, error)
@@ -1,8 +1,8 @@
-import requests
-import json
 from datetime import datetime, timedelta
 import os
 
+from odoo_client import OdooClient, OdooError
+
 # Configuration - modified for GitHub Actions
 SERVICE_ACCOUNT_FILE = 'service_account.json'
 SPREADSHEET_ID = '1nHciwKuK_G2wKd4G5i4Fo1gpMNJoscxaDt-LIGHH2EU'
@@ -20,31 +20,16 @@ def authenticate_odoo():
     login = os.environ.get('ODOO_USERNAME')
     password = os.environ.get('ODOO_PASSWORD')
     
-    headers = {"Content-Type": "application/json"}
-    auth_data = {
-        "jsonrpc": "2.0",
-        "params": {
-            "db": ODOO_DB,
-            "login": login,
-            "password": password
-        }
-    }
-    
-    response = requests.post(ODOO_URL + "/web/session/authenticate", data=json.dumps(auth_data), headers=headers)
-    
-    if response.status_code == 200 and "result" in response.json():
-        return response.cookies.get('session_id')
-    else:
+    odoo = OdooClient(ODOO_URL, ODOO_DB, login, password)
+    try:
+        odoo.authenticate()
+    except OdooError:
         print("Authentication failed")
         return None
+    return odoo
 
-def test_all_models(session_id):
+def test_all_models(odoo):
     """Test multiple models to see what exists"""
-    headers = {
-        "Content-Type": "application/json",
-        "Cookie": f"session_id={session_id}"
-    }
-
     models_to_test = [
         "sale.order",
         "sale.order.line", 
@@ -58,30 +43,16 @@ def test_all_models(session_id):
     for model in models_to_test:
         print(f"Testing {model}...")
         
-        data = {
-            "jsonrpc": "2.0",
-            "method": "call",
-            "params": {
-                "model": model,
-                "method": "search_read",
-                "args": [[]],  # No filters
-                "kwargs": {
-                    "fields": ["id"],
-                    "limit": 5
-                }
-            }
-        }
+        try:
+            result = odoo.search_read(model, [], ["id"], limit=5)  # No filters
+        except OdooError as e:
+            print(f"  {model}: ERROR {e}")
+            results.append([model, 0, f"ERROR {e}"])
+            continue
 
-        response = requests.post(ODOO_URL + f"/web/dataset/call_kw/{model}/search_read", data=json.dumps(data), headers=headers)
-        
-        if response.status_code == 200:
-            result = response.json().get("result", [])
-            count = len(result)
-            print(f"  {model}: {count} records found")
-            results.append([model, count, "SUCCESS"])
-        else:
-            print(f"  {model}: ERROR {response.status_code}")
-            results.append([model, 0, f"ERROR {response.status_code}"])
+        count = len(result)
+        print(f"  {model}: {count} records found")
+        results.append([model, count, "SUCCESS"])
     
     return results
 
@@ -110,15 +81,15 @@ def write_debug_to_sheet(sheets, results):
 def main():
     print("Starting Odoo model test...")
     
-    session_id = authenticate_odoo()
-    if not session_id:
+    odoo = authenticate_odoo()
+    if not odoo:
         print("Failed to authenticate with Odoo")
         return
     
     print("Authentication successful")
     
     # Test all models
-    results = test_all_models(session_id)
+    results = test_all_models(odoo)
     
     # Always write to sheet, even if empty
     from google.oauth2.service_account import Credentials
@@ -1,8 +1,8 @@
-import requests
-import json
 from datetime import datetime, timedelta
 import os
 
+from odoo_client import OdooClient, OdooError
+
 # Configuration - modified for GitHub Actions
 SERVICE_ACCOUNT_FILE = 'service_account.json'
 SPREADSHEET_ID = '1nHciwKuK_G2wKd4G5i4Fo1gpMNJoscxaDt-LIGHH2EU'
@@ -20,74 +20,49 @@ def authenticate_odoo():
     login = os.environ.get('ODOO_USERNAME')
     password = os.environ.get('ODOO_PASSWORD')
     
-    headers = {"Content-Type": "application/json"}
-    auth_data = {
-        "jsonrpc": "2.0",
-        "params": {
-            "db": ODOO_DB,
-            "login": login,
-            "password": password
-        }
-    }
-    
-    response = requests.post(ODOO_URL + "/web/session/authenticate", data=json.dumps(auth_data), headers=headers)
-    
-    if response.status_code == 200 and "result" in response.json():
-        return response.cookies.get('session_id')
-    else:
+    odoo = OdooClient(ODOO_URL, ODOO_DB, login, password)
+    try:
+        odoo.authenticate()
+    except OdooError:
         print("Authentication failed")
         return None
+    return odoo
 
-def get_opportunities(session_id):
+def get_opportunities(odoo):
     """Get opportunities from last 30 days"""
-    headers = {
-        "Content-Type": "application/json",
-        "Cookie": f"session_id={session_id}"
-    }
-
     thirty_days_ago = (datetime.now() - timedelta(days=30)).strftime('%Y-%m-%d')
     today = datetime.now().strftime('%Y-%m-%d')
 
-    data = {
-        "jsonrpc": "2.0",
-        "method": "call",
-        "params": {
-            "model": "crm.lead",
-            "method": "search_read",
-            "args": [[
+    try:
+        result = odoo.search_read(
+            "crm.lead",
+            [
                 "&",
                 ("type", "=", "opportunity"),
                 ("create_date", ">=", f"{thirty_days_ago} 00:00:00"),
                 ("create_date", "<=", f"{today} 23:59:59")
-            ]],
-            "kwargs": {
-                "fields": [
-                    "id", 
-                    "create_date",
-                    "name",
-                    "stage_id",
-                    "source_id",
-                    "medium_id",
-                    "campaign_id",
-                    "website_id",
-                    "expected_revenue",
-                    "user_id"
-                ],
-                "order": "create_date desc"
-            }
-        }
-    }
-
-    response = requests.post(ODOO_URL + "/web/dataset/call_kw/crm.lead/search_read", data=json.dumps(data), headers=headers)
-
-    if response.status_code == 200:
-        result = response.json().get("result", [])
-        print(f"API Response successful, found {len(result)} records")
-        return result
-    else:
-        print(f"API Error: {response.status_code}")
+            ],
+            [
+                "id", 
+                "create_date",
+                "name",
+                "stage_id",
+                "source_id",
+                "medium_id",
+                "campaign_id",
+                "website_id",
+                "expected_revenue",
+                "user_id"
+            ],
+            order="create_date desc"
+        )
+    except OdooError as e:
+        print(f"API Error: {e}")
         return []
 
+    print(f"API Response successful, found {len(result)} records")
+    return result
+
 def write_to_odoo_sales_tab(sheets, opportunities):
     """Write data to the 'odoo_sales' tab"""
     try:
@@ -142,14 +117,14 @@ def write_to_odoo_sales_tab(sheets, opportunities):
 def main():
     print("Starting Odoo sales data collection...")
     
-    session_id = authenticate_odoo()
-    if not session_id:
+    odoo = authenticate_odoo()
+    if not odoo:
         print("Failed to authenticate with Odoo")
         return
     
     print("Authentication successful")
     
-    opportunities = get_opportunities(session_id)
+    opportunities = get_opportunities(odoo)
     
     if opportunities:
         from google.oauth2.service_account import Credentials
@@ -0,0 +1,238 @@
+import hashlib
+import json
+
+from gspread.exceptions import APIError
+from gspread.utils import a1_range_to_grid_range
+
+# Developer metadata key holding the fingerprint (and rules) of the formatting last applied to a sheet
+FORMAT_FINGERPRINT_KEY = 'sheets_batch.format_fingerprint'
+
+
+def _cell(value):
+    """Cell data for one value, stored as-is like a RAW `worksheet.update`"""
+    if value is None or value == "":
+        return {}
+    if isinstance(value, bool):
+        return {"userEnteredValue": {"boolValue": value}}
+    if isinstance(value, (int, float)):
+        return {"userEnteredValue": {"numberValue": value}}
+    return {"userEnteredValue": {"stringValue": str(value)}}
+
+
+def _rule_key(rule):
+    """Comparable form of a boolean rule's condition and ranges.
+
+    The API leaves out empty `values` and zero indexes, so both sides are
+    normalised the same way.
+    """
+    condition = rule.get('booleanRule', {}).get('condition') or {}
+    ranges = [
+        [r.get('startRowIndex', 0), r.get('endRowIndex'), r.get('startColumnIndex', 0), r.get('endColumnIndex')]
+        for r in rule.get('ranges', [])
+    ]
+    return json.dumps([condition.get('type'), condition.get('values', []), ranges], sort_keys=True)
+
+
+def _load_template_record(stored):
+    """Return (fingerprint, rule keys) from our developer metadata value"""
+    if not stored:
+        return None, []
+    try:
+        record = json.loads(stored.get('metadataValue', ''))
+    except ValueError:  # Written before the rule keys were recorded: a bare fingerprint
+        return stored.get('metadataValue'), []
+    return record.get('fingerprint'), record.get('rules', [])
+
+
+class SheetBatch:
+    """Collect the writes for one worksheet and send them as one `spreadsheets.batchUpdate`.
+
+    Queue the clear, the values, the cell formats, the freezes and the
+    conditional formats with the methods below, then call `send()`. The
+    requests are applied in order, so clear and values come first. If the
+    formatting is rejected, the values are sent again on their own, the way
+    a failed `format()` used to leave the written data in place.
+
+    With `template=True` the queued formatting is treated as a fixed
+    template. Its fingerprint is stored in the sheet's developer metadata.
+    The formatting is applied only when the fingerprint changes. The
+    metadata also lists the conditional format rules the template added.
+    Before adding its rules again, it deletes existing rules whose
+    condition and ranges match the new template or that recorded list, so
+    the rules are replaced instead of piling up run after run. Rules
+    added by hand on other ranges are left alone.
+    """
+
+    def __init__(self, worksheet, template=False):
+        self.worksheet = worksheet
+        self.template = template
+        self.sheet_id = worksheet.id
+        self.row_count = worksheet.row_count
+        self.col_count = worksheet.col_count
+        self.data_requests = []
+        self.format_requests = []
+        self.rules = []
+
+    def _grid_range(self, range_name):
+        return a1_range_to_grid_range(range_name, self.sheet_id)
+
+    def resize(self, rows=None, cols=None):
+        """Set the grid size of the worksheet"""
+        properties = {}
+        if rows is not None:
+            properties["rowCount"] = self.row_count = rows
+        if cols is not None:
+            properties["columnCount"] = self.col_count = cols
+        self.data_requests.append({
+            "updateSheetProperties": {
+                "properties": {"sheetId": self.sheet_id, "gridProperties": properties},
+                "fields": ",".join(f"gridProperties.{field}" for field in properties)
+            }
+        })
+        return self
+
+    def clear(self):
+        """Clear every value of the worksheet, keeping its formatting like `worksheet.clear()`"""
+        self.data_requests.append({
+            "updateCells": {"range": {"sheetId": self.sheet_id}, "fields": "userEnteredValue"}
+        })
+        return self
+
+    def values(self, values, row=1, col=1):
+        """Write rows of values with their top-left cell at (`row`, `col`), growing the grid if needed"""
+        last_row = row + len(values) - 1
+        last_col = col + max((len(r) for r in values), default=1) - 1
+        if last_row > self.row_count or last_col > self.col_count:
+            self.resize(max(last_row, self.row_count), max(last_col, self.col_count))
+
+        self.data_requests.append({
+            "updateCells": {
+                "start": {"sheetId": self.sheet_id, "rowIndex": row - 1, "columnIndex": col - 1},
+                "rows": [{"values": [_cell(value) for value in r]} for r in values],
+                "fields": "userEnteredValue"
+            }
+        })
+        return self
+
+    def format(self, range_name, cell_format):
+        """Apply `cell_format` to an A1 range, the batched version of `worksheet.format()`"""
+        self.format_requests.append({
+            "repeatCell": {
+                "range": self._grid_range(range_name),
+                "cell": {"userEnteredFormat": cell_format},
+                "fields": "userEnteredFormat({})".format(",".join(cell_format))
+            }
+        })
+        return self
+
+    def freeze(self, rows=None, cols=None):
+        """Freeze the first `rows` rows and/or `cols` columns"""
+        properties = {}
+        if rows is not None:
+            properties["frozenRowCount"] = rows
+        if cols is not None:
+            properties["frozenColumnCount"] = cols
+        self.format_requests.append({
+            "updateSheetProperties": {
+                "properties": {"sheetId": self.sheet_id, "gridProperties": properties},
+                "fields": ",".join(f"gridProperties.{field}" for field in properties)
+            }
+        })
+        return self
+
+    def conditional_format(self, range_name, condition_type, values, cell_format):
+        """Add a boolean conditional format rule, e.g. ("TEXT_CONTAINS", ["↑"], {"textFormat": ...})"""
+        rule = {
+            "ranges": [self._grid_range(range_name)],
+            "booleanRule": {
+                "condition": {
+                    "type": condition_type,
+                    "values": [{"userEnteredValue": str(value)} for value in values]
+                },
+                "format": cell_format
+            }
+        }
+        self.rules.append(rule)
+        self.format_requests.append({"addConditionalFormatRule": {"rule": rule, "index": 0}})
+        return self
+
+    def _fingerprint(self):
+        template = json.dumps(self.format_requests, sort_keys=True)
+        return hashlib.sha256(template.encode('utf-8')).hexdigest()
+
+    def _apply_template(self):
+        """Drop the formatting if the sheet already has it, otherwise replace our old rules and record it"""
+        try:
+            metadata = self.worksheet.spreadsheet.fetch_sheet_metadata(
+                {'fields': 'sheets(properties(sheetId),conditionalFormats(ranges,booleanRule(condition)),developerMetadata)'}
+            )
+        except Exception as e:
+            # Without knowing the current rules, adding ours could duplicate them; write the data only
+            print(f"Note: Formatting of '{self.worksheet.title}' skipped, its current rules could not be read: {e}")
+            self.format_requests = []
+            return
+        sheet = next((s for s in metadata['sheets'] if s['properties']['sheetId'] == self.sheet_id), {})
+        stored = next(
+            (m for m in sheet.get('developerMetadata', []) if m['metadataKey'] == FORMAT_FINGERPRINT_KEY),
+            None
+        )
+        stored_fingerprint, stored_rules = _load_template_record(stored)
+
+        fingerprint = self._fingerprint()
+        if stored_fingerprint == fingerprint:
+            print(f"Formatting of '{self.worksheet.title}' is up to date")
+            self.format_requests = []
+            return
+
+        # Ours are the rules of this template and those the previous template recorded.
+        # Delete from the last index down so the indexes still to delete stay valid
+        rules = sheet.get('conditionalFormats', [])
+        rule_keys = [_rule_key(rule) for rule in self.rules]
+        ours = set(rule_keys) | set(stored_rules)
+        deletes = [
+            {"deleteConditionalFormatRule": {"sheetId": self.sheet_id, "index": index}}
+            for index in reversed(range(len(rules)))
+            if _rule_key(rules[index]) in ours
+        ]
+        value = json.dumps({"fingerprint": fingerprint, "rules": rule_keys})
+        if stored:
+            record = {
+                "updateDeveloperMetadata": {
+                    "dataFilters": [{"developerMetadataLookup": {"metadataId": stored['metadataId']}}],
+                    "developerMetadata": {"metadataValue": value},
+                    "fields": "metadataValue"
+                }
+            }
+        else:
+            record = {
+                "createDeveloperMetadata": {
+                    "developerMetadata": {
+                        "metadataKey": FORMAT_FINGERPRINT_KEY,
+                        "metadataValue": value,
+                        "location": {"sheetId": self.sheet_id},
+                        "visibility": "DOCUMENT"
+                    }
+                }
+            }
+        if deletes:
+            print(f"Replacing {len(deletes)} conditional format rule(s) on '{self.worksheet.title}'")
+        self.format_requests = deletes + self.format_requests + [record]
+
+    def send(self):
+        """Send everything queued in one batchUpdate; returns the number of requests sent"""
+        if self.template and self.format_requests:
+            self._apply_template()
+        requests = self.data_requests + self.format_requests
+        if not requests:
+            return 0
+        try:
+            self.worksheet.spreadsheet.batch_update({"requests": requests})
+        except APIError as e:
+            if not self.format_requests or not self.data_requests:
+                raise
+            print(f"Note: Some formatting could not be applied: {e}")
+            self.worksheet.spreadsheet.batch_update({"requests": self.data_requests})
+        self.data_requests = []
+        self.format_requests = []
+        self.rules = []
+        return len(requests)
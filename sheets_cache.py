@@ -0,0 +1,47 @@
+import gspread
+from google.oauth2.service_account import Credentials
+
+# Process-level handles, so a script authorizes once and fetches each
+# spreadsheet's metadata once no matter how many functions read from it
+_clients = {}  # (service account file, scopes) -> authorized gspread client
+_spreadsheets = {}  # spreadsheet id -> Spreadsheet
+_worksheets = {}  # (spreadsheet id, worksheet title) -> Worksheet
+
+
+def get_client(service_account_file, scopes):
+    """Return the authorized gspread client for these credentials, authorizing on first use"""
+    key = (service_account_file, tuple(scopes))
+    if key not in _clients:
+        credentials = Credentials.from_service_account_file(service_account_file, scopes=scopes)
+        _clients[key] = gspread.authorize(credentials)
+    return _clients[key]
+
+
+def open_spreadsheet(client, spreadsheet_id):
+    """Return the Spreadsheet for `spreadsheet_id`, opening it on first use"""
+    if spreadsheet_id not in _spreadsheets:
+        _spreadsheets[spreadsheet_id] = client.open_by_key(spreadsheet_id)
+    return _spreadsheets[spreadsheet_id]
+
+
+def open_worksheet(client, spreadsheet_id, title):
+    """Return the worksheet called `title`.
+
+    The first miss lists every worksheet of the spreadsheet with one
+    metadata call and caches them all. Raises
+    gspread.exceptions.WorksheetNotFound like `Spreadsheet.worksheet`.
+    """
+    key = (spreadsheet_id, title)
+    if key not in _worksheets:
+        for worksheet in open_spreadsheet(client, spreadsheet_id).worksheets():
+            _worksheets[(spreadsheet_id, worksheet.title)] = worksheet
+    if key not in _worksheets:
+        raise gspread.exceptions.WorksheetNotFound(title)
+    return _worksheets[key]
+
+
+def add_worksheet(client, spreadsheet_id, title, rows, cols):
+    """Create a worksheet and cache its handle"""
+    worksheet = open_spreadsheet(client, spreadsheet_id).add_worksheet(title=title, rows=rows, cols=cols)
+    _worksheets[(spreadsheet_id, title)] = worksheet
+    return worksheet
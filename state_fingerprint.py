@@ -0,0 +1,41 @@
+import hashlib
+import os
+import sqlite3
+import sys
+
+# Local state directory the workflows cache between runs
+STATE_DIR = os.environ.get('STATE_DIR', '.state')
+
+
+def file_digest(path):
+    """Hash one state file; SQLite databases are hashed by their rows, not their bytes"""
+    digest = hashlib.sha256()
+    if path.endswith('.sqlite3'):
+        # The file header changes on every commit even when no row did
+        conn = sqlite3.connect(path)
+        try:
+            for line in conn.iterdump():
+                digest.update(line.encode('utf-8'))
+        finally:
+            conn.close()
+    else:
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                digest.update(block)
+    return digest.hexdigest()
+
+
+def state_fingerprint(state_dir=STATE_DIR):
+    """Return a short hash of everything in `state_dir`, stable while its content doesn't change"""
+    digest = hashlib.sha256()
+    for root, _, files in sorted(os.walk(state_dir)):
+        for name in sorted(files):
+            if name.endswith(('.tmp', '-journal')):
+                continue
+            path = os.path.join(root, name)
+            digest.update(f"{os.path.relpath(path, state_dir)}\0{file_digest(path)}\n".encode('utf-8'))
+    return digest.hexdigest()[:16]
+
+
+if __name__ == '__main__':
+    print(state_fingerprint(sys.argv[1] if len(sys.argv) > 1 else STATE_DIR))
@@ -0,0 +1,212 @@
+import hashlib
+import io
+import json
+import os
+import re
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from html.parser import HTMLParser
+
+from urllib.parse import quote, urlsplit
+
+import requests
+from google.auth.transport.requests import AuthorizedSession
+from requests.adapters import HTTPAdapter
+
+try:
+    import pypdf
+except ImportError:  # PDF support files are skipped without it
+    pypdf = None
+
+# Extracted text of support files, one JSON file per URL
+SUPPORT_DOCS_CACHE_DIR = os.environ.get('SUPPORT_DOCS_CACHE_DIR', '.state/support_docs')
+# Support files downloaded at the same time
+SUPPORT_DOCS_WORKERS = int(os.environ.get('SUPPORT_DOCS_WORKERS', '8'))
+# Seconds to wait for a support file before giving up on it
+SUPPORT_DOCS_TIMEOUT = float(os.environ.get('SUPPORT_DOCS_TIMEOUT', '30'))
+
+DRIVE_FILES_API = 'https://www.googleapis.com/drive/v3/files/'
+# Export format of each kind of Google file (Sheets export their first sheet)
+GOOGLE_EXPORTS = {
+    'document': 'text/plain',
+    'spreadsheets': 'text/csv',
+    'presentation': 'text/plain'
+}
+
+
+class _TextExtractor(HTMLParser):
+    """Collect the visible text of an HTML page"""
+
+    def __init__(self):
+        super().__init__()
+        self.parts = []
+        self._skip = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in ('script', 'style', 'noscript'):
+            self._skip += 1
+
+    def handle_endtag(self, tag):
+        if tag in ('script', 'style', 'noscript') and self._skip:
+            self._skip -= 1
+
+    def handle_data(self, data):
+        if not self._skip and data.strip():
+            self.parts.append(data.strip())
+
+
+def google_download(url):
+    """Return (Drive API URL, expected Content-Type) for a Google Docs, Sheets, Slides or Drive link, else None.
+
+    Files are read through the Drive API so private files shared with the
+    service account work, and the viewer page is never mistaken for content.
+    """
+    match = re.match(r'https://docs\.google\.com/(document|spreadsheets|presentation)/d/([\w-]+)', url)
+    if match:
+        kind, file_id = match.groups()
+        return f'{DRIVE_FILES_API}{file_id}/export?mimeType={quote(GOOGLE_EXPORTS[kind], safe="")}', GOOGLE_EXPORTS[kind]
+    match = re.match(r'https://drive\.google\.com/(?:file/d/|open\?id=)([\w-]+)', url)
+    if match:
+        return f'{DRIVE_FILES_API}{match.group(1)}?alt=media', None
+    return None
+
+
+def extract_text(response):
+    """Extract plain text from a downloaded file, or None for types we can't read"""
+    content_type = response.headers.get('Content-Type', '').split(';')[0].strip().lower()
+
+    if content_type == 'text/html':
+        extractor = _TextExtractor()
+        extractor.feed(response.text)
+        return "\n".join(extractor.parts)
+    if content_type.startswith('text/') or content_type in ('application/json', 'application/xml', 'application/csv'):
+        return response.text
+    if content_type == 'application/pdf' or response.url.lower().endswith('.pdf'):
+        if pypdf is None:
+            print(f"✗ Skipping PDF {response.url}: pypdf is not installed")
+            return None
+        reader = pypdf.PdfReader(io.BytesIO(response.content))
+        return "\n".join(page.extract_text() or '' for page in reader.pages)
+    return None
+
+
+class SupportDocuments:
+    """Download support files concurrently and keep their extracted text on disk.
+
+    Each cached entry remembers the ETag and Last-Modified headers of its
+    file, so a file that didn't change costs one conditional request that
+    returns 304. If a download fails the last cached text is used.
+
+    Google files are downloaded through the Drive API with `credentials`
+    (the files must be shared with the service account); without
+    credentials they are skipped. A response that lands on the Google
+    sign-in page, or isn't in the requested export format, is rejected.
+    """
+
+    def __init__(self, cache_dir=SUPPORT_DOCS_CACHE_DIR, workers=SUPPORT_DOCS_WORKERS, timeout=SUPPORT_DOCS_TIMEOUT,
+                 credentials=None):
+        self.cache_dir = cache_dir
+        self.workers = workers
+        self.timeout = timeout
+        self.session = requests.Session()
+        self.google_session = AuthorizedSession(credentials) if credentials else None
+        for session in (self.session, self.google_session):
+            if session is not None:
+                adapter = HTTPAdapter(pool_maxsize=workers)
+                session.mount('https://', adapter)
+                session.mount('http://', adapter)
+
+    def _path(self, url):
+        return os.path.join(self.cache_dir, hashlib.sha256(url.encode('utf-8')).hexdigest() + '.json')
+
+    def _load(self, url):
+        try:
+            with open(self._path(url)) as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def _save(self, url, entry):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+        with os.fdopen(fd, 'w') as f:
+            json.dump(entry, f)
+        os.replace(tmp_path, self._path(url))
+
+    def fetch(self, url):
+        """Return the text of one support file (from the cache when it didn't change), or None"""
+        google = google_download(url)
+        if google and self.google_session is None:
+            print(f"✗ Skipping Google file {url}: no service account credentials to read it with")
+            return None
+        download, expected_type = google or (url, None)
+        session = self.google_session if google else self.session
+
+        # Entries downloaded from another URL (e.g. the old unauthenticated exports) are not trusted
+        cached = self._load(url)
+        if cached and cached.get('download') != download:
+            cached = None
+        headers = {}
+        if cached and cached.get('etag'):
+            headers['If-None-Match'] = cached['etag']
+        if cached and cached.get('last_modified'):
+            headers['If-Modified-Since'] = cached['last_modified']
+
+        try:
+            response = session.get(download, headers=headers, timeout=self.timeout)
+            if response.status_code == 304 and cached:
+                print(f"✓ Support file unchanged: {url}")
+                return cached['text']
+            response.raise_for_status()
+            if urlsplit(response.url).hostname == 'accounts.google.com':
+                raise ValueError("redirected to the Google sign-in page, the file isn't shared with us")
+            content_type = response.headers.get('Content-Type', '').split(';')[0].strip().lower()
+            if expected_type and content_type != expected_type:
+                raise ValueError(f"expected {expected_type}, got {content_type or 'no Content-Type'}")
+            text = extract_text(response)
+        except Exception as e:
+            print(f"✗ Error downloading support file {url}: {e}")
+            return cached['text'] if cached else None
+
+        if text is None:
+            print(f"✗ Can't extract text from {url} ({response.headers.get('Content-Type', 'unknown type')})")
+            return None
+
+        self._save(url, {
+            'url': url,
+            'download': download,
+            'etag': response.headers.get('ETag'),
+            'last_modified': response.headers.get('Last-Modified'),
+            'fetched_at': time.time(),
+            'text': text
+        })
+        print(f"✓ Downloaded support file: {url} ({len(text)} characters)")
+        return text
+
+    def fetch_all(self, urls):
+        """Fetch every URL concurrently; returns {url: text} for the files that could be read"""
+        if not urls:
+            return {}
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            texts = list(pool.map(self.fetch, urls))
+        return {url: text for url, text in zip(urls, texts) if text}
+
+
+def fit_to_budget(documents, token_budget, estimate_tokens):
+    """Trim {url: text} so all texts together stay within `token_budget`.
+
+    The budget is shared evenly; what the shorter files don't use goes to
+    the longer ones. The order of `documents` is kept.
+    """
+    tokens = {url: estimate_tokens(text) for url, text in documents.items()}
+    fitted = {}
+    remaining = token_budget
+    for i, url in enumerate(sorted(documents, key=tokens.get)):
+        share = remaining // (len(documents) - i)
+        text = documents[url]
+        if tokens[url] > share:
+            text = text[:len(text) * share // tokens[url]] + "\n[...truncated]"
+        fitted[url] = text
+        remaining -= min(tokens[url], share)
+    return {url: fitted[url] for url in documents}
@@ -0,0 +1,93 @@
+import json
+import os
+import time
+
+from odoo_client import OdooError
+
+# utm.campaign name -> id cache kept between runs
+UTM_CAMPAIGN_CACHE_PATH = os.environ.get('UTM_CAMPAIGN_CACHE_PATH', '.state/utm_campaigns.json')
+# Hours a cached campaign id is trusted before it is looked up in Odoo again
+UTM_CAMPAIGN_CACHE_TTL_HOURS = float(os.environ.get('UTM_CAMPAIGN_CACHE_TTL_HOURS', '24'))
+
+
+class CampaignResolver:
+    """Resolve utm.campaign names to ids in bulk, creating the missing ones.
+
+    Names that are not cached (or whose cache entry expired) are looked up
+    with one `name in [...]` search_read, and the ones Odoo doesn't have are
+    created with a single multi-record `create`. Resolved ids are saved to
+    disk, so names seen in an earlier run cost no round-trips until they expire.
+    Names that could not be resolved are remembered (in memory only) for
+    the rest of the run, so a failing Odoo isn't asked again for each call.
+    """
+
+    def __init__(self, odoo, cache_path=UTM_CAMPAIGN_CACHE_PATH, ttl_hours=UTM_CAMPAIGN_CACHE_TTL_HOURS):
+        self.odoo = odoo
+        self.cache_path = cache_path
+        self.ttl = ttl_hours * 3600
+        try:
+            with open(cache_path) as f:
+                self._cache = json.load(f)
+        except (FileNotFoundError, ValueError):
+            self._cache = {}
+        self._failed = set()  # Names whose search or create failed in this run
+
+    def _is_fresh(self, name):
+        entry = self._cache.get(name)
+        return entry is not None and time.time() - entry['fetched_at'] < self.ttl
+
+    def _save(self):
+        directory = os.path.dirname(self.cache_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = self.cache_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(self._cache, f, indent=2)
+        os.replace(tmp_path, self.cache_path)
+
+    def resolve(self, names):
+        """Return {name: id} for `names`, fetching and creating what is missing"""
+        names = list(dict.fromkeys(name.strip() for name in names if name and name.strip()))
+        missing = [name for name in names if not self._is_fresh(name) and name not in self._failed]
+
+        if missing:
+            print(f"Resolving {len(missing)} campaign(s) in Odoo: {missing}")
+            now = time.time()
+            try:
+                found = self.odoo.search_read("utm.campaign", [["name", "in", missing]], ["id", "name"])
+            except OdooError as e:
+                print(f"Failed to search campaigns. {e}")
+                found = None
+
+            if found is not None:
+                found_names = set()
+                for campaign in found:
+                    # Keep the first match per name, like the old limit=1 lookup
+                    if campaign['name'] in found_names:
+                        continue
+                    found_names.add(campaign['name'])
+                    self._cache[campaign['name']] = {'id': campaign['id'], 'fetched_at': now}
+
+                to_create = [name for name in missing if name not in found_names]
+                if to_create:
+                    try:
+                        new_ids = self.odoo.create("utm.campaign", [{"name": name} for name in to_create])
+                    except OdooError as e:
+                        print(f"Failed to create campaigns {to_create}. {e}")
+                        new_ids = []
+                    for name, campaign_id in zip(to_create, new_ids):
+                        print(f"Created new campaign '{name}' with ID {campaign_id}")
+                        self._cache[name] = {'id': campaign_id, 'fetched_at': now}
+
+                self._save()
+
+            # Still unresolved (an expired entry keeps serving its old id)
+            self._failed.update(name for name in missing if not self._is_fresh(name))
+
+        return {name: self._cache[name]['id'] for name in names if name in self._cache}
+
+    def get(self, name):
+        """Return the id for one campaign name (resolving it if needed), or None"""
+        if not name or not name.strip():
+            return None
+        return self.resolve([name]).get(name.strip())